@@ -0,0 +1,251 @@
+"""
+Benchmark the ESG scoring pipeline stages offline.
+
+Uses the llm_input fixtures as database content, an in-memory stand-in for
+the Supabase client and the deterministic stub LLM, so timings only reflect
+local processing plus any simulated latency.
+
+Example:
+    python agents/benchmark_scoring.py --iterations 5 --report bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from scoring_agent import ESGScoringAgent, DeterministicStubModel
+
+STAGES = ['fetch_companies_data', 'fetch_company_data', 'preprocess_data', 'compact_data',
+          '_generate_prompt', 'parse_scores', '_store_scores', 'flush_scores']
+
+
+class FixtureQuery:
+    """Chainable query over in-memory rows, mimicking the PostgREST builder"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.row_range = None
+        self.order_by = []
+        self.payload = None
+        self.on_conflict = None
+        self.action = 'select'
+
+    def select(self, *columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.row_range = (start, end)
+        return self
+
+    def update(self, payload):
+        self.action, self.payload = 'update', payload
+        return self
+
+    def insert(self, payload):
+        self.action, self.payload = 'insert', payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self.action, self.payload = 'upsert', payload
+        self.on_conflict = on_conflict
+        return self
+
+    def execute(self):
+        if self.db.latency:
+            time.sleep(self.db.latency)
+        rows = self.db.tables.setdefault(self.table, [])
+        matches = [row for row in rows if all(f(row) for f in self.filters)]
+
+        if self.action == 'update':
+            for row in matches:
+                row.update(self.payload)
+            return SimpleNamespace(data=matches)
+        if self.action in ('insert', 'upsert'):
+            payload = self.payload if isinstance(
+                self.payload, list) else [self.payload]
+            for new_row in payload:
+                existing = [row for row in rows if self.on_conflict and
+                            row.get(self.on_conflict) == new_row.get(self.on_conflict)]
+                if existing:
+                    existing[0].update(new_row)
+                else:
+                    rows.append(dict(new_row))
+            return SimpleNamespace(data=payload)
+
+        # Stable sorts applied last-first give the combined multi-column order
+        for column, desc in reversed(self.order_by):
+            matches.sort(key=lambda row: (row.get(column) is None, str(row.get(column))),
+                         reverse=desc)
+        if self.row_range:
+            matches = matches[self.row_range[0]:self.row_range[1] + 1]
+        return SimpleNamespace(data=matches)
+
+
+class FixtureSupabaseClient:
+    """In-memory Supabase stand-in seeded from llm_input snapshots"""
+
+    def __init__(self, snapshot_dir, latency=0.0):
+        self.latency = latency
+        self.tables = {name: [] for name in [
+            'companies', 'financials', 'market_data', 'governance_risk',
+            'esg_scores', 'sentiment_data', 'esg_report_analysis', 'final_esg_scores']}
+        self.tickers = []
+
+        for name in sorted(os.listdir(snapshot_dir)):
+            if not name.endswith('.json'):
+                continue
+            ticker = os.path.splitext(name)[0]
+            with open(os.path.join(snapshot_dir, name), 'r') as f:
+                snapshot = json.load(f)
+            self._seed(ticker, snapshot)
+            self.tickers.append(ticker)
+
+    def _seed(self, ticker, snapshot):
+        """Turn a preprocessed snapshot back into raw table rows"""
+        company = snapshot.get('company') or {}
+        self.tables['companies'].append({**company, 'ticker': ticker})
+        self.tables['market_data'].append(
+            {'ticker': ticker, 'market_cap': company.get('market_cap')})
+        for fin in snapshot.get('financials') or []:
+            self.tables['financials'].append({**fin, 'ticker': ticker})
+        for item in snapshot.get('sentiment_data') or []:
+            self.tables['sentiment_data'].append({**item, 'ticker': ticker})
+        for key, table in [('governance_risk', 'governance_risk'),
+                           ('esg_scores', 'esg_scores'),
+                           ('esg_report_analysis', 'esg_report_analysis')]:
+            if snapshot.get(key):
+                self.tables[table].append({**snapshot[key], 'ticker': ticker})
+
+    def table(self, name):
+        return FixtureQuery(self, name)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    """p50/p95/mean in milliseconds plus throughput for one stage"""
+    total = sum(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'mean_ms': round(total / len(samples) * 1000, 3),
+        'throughput_per_s': round(len(samples) / total, 1) if total else None
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(snapshot_dir, iterations=3, db_latency=0.0):
+    """Time every pipeline stage for every fixture and return a report"""
+    db = FixtureSupabaseClient(snapshot_dir, latency=db_latency)
+    agent = ESGScoringAgent(use_cache=False, model=DeterministicStubModel(),
+                            supabase_client=db)
+    samples = {stage: [] for stage in STAGES}
+
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        samples[stage].append(time.perf_counter() - start)
+        return result
+
+    run_start = time.perf_counter()
+    for _ in range(iterations):
+        # process_companies loads every table once up front
+        company_data = timed('fetch_companies_data',
+                             agent.fetch_companies_data, db.tickers)
+        for ticker in db.tickers:
+            # The per-ticker fetch is only the fallback path, so it is
+            # timed for comparison but left out of the run total
+            timed('fetch_company_data', agent.fetch_company_data, ticker)
+            processed = timed('preprocess_data',
+                              agent.preprocess_data, company_data[ticker])
+            compacted = timed('compact_data', agent.compact_data, processed)
+            prompt = timed('_generate_prompt',
+                           agent._generate_prompt, compacted)
+            response_text = agent.model.generate_content(prompt).text
+            scores = timed('parse_scores', agent._scores_from_text, response_text)
+            # Buffers the row, upserting when the writer's batch is full
+            timed('_store_scores', agent._store_scores, ticker, scores)
+        # process_companies flushes whatever is left once per run
+        timed('flush_scores', agent.score_writer.flush)
+    agent.close()
+    elapsed = time.perf_counter() - run_start - sum(samples['fetch_company_data'])
+
+    companies = iterations * len(db.tickers)
+    return {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'snapshot_dir': snapshot_dir,
+        'iterations': iterations,
+        'companies': companies,
+        'db_latency_ms': db_latency * 1000,
+        'total_seconds': round(elapsed, 3),
+        'companies_per_s': round(companies / elapsed, 1),
+        'stages': {stage: summarize(values) for stage, values in samples.items()}
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Benchmark ESG scoring pipeline stages with fixtures and stubs')
+    parser.add_argument('--snapshots', default='llm_input',
+                        help='Directory of llm_input style snapshots')
+    parser.add_argument('--iterations', '-n', type=int, default=3,
+                        help='Passes over all fixtures')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                        help='Simulated round-trip latency per database call')
+    parser.add_argument('--report', '-r',
+                        help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    # Keep per-company logging out of the timings
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run_benchmark(args.snapshots, args.iterations,
+                           args.db_latency_ms / 1000)
+
+    print(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'ops/s':>12}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<22}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['throughput_per_s']:>12}")
+    print(f"{report['companies']} companies in {report['total_seconds']}s "
+          f"({report['companies_per_s']} companies/s)")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.report}")
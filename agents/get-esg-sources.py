@@ -21,11 +21,6 @@ from utils.db import execute_query, get_companies  # Import the database utility
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database connection parameters
-DB_URL = os.getenv('SUPABASE_URL')
-if not DB_URL:
-    raise ValueError("SUPABASE_URL environment variable is not set")
-
 # tickers
 TICKERS = [
     "ACX.TO",
@@ -402,6 +397,10 @@ def search_2025_reports(sorted_companies, tickers):
 
 
 if __name__ == "__main__":
+    # Database connection parameters
+    if not os.getenv('SUPABASE_URL'):
+        raise ValueError("SUPABASE_URL environment variable is not set")
+
     companies = COMPANIES
     tickers = TICKERS
     # data = get_companies()
@@ -1,20 +1,11 @@
-from pygooglenews import GoogleNews
 import json
 import time
 from bs4 import BeautifulSoup
 import html
-import newspaper
 import json
 import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-import os
 from datetime import datetime, timedelta
 import logging
-import psycopg2
-from psycopg2.extras import execute_batch
 from dateutil import parser
 import sys
 from pathlib import Path
@@ -22,16 +13,13 @@ from pathlib import Path
 # Add the root directory to Python path
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
-from utils.db import get_companies
+from utils.db import execute_many, get_companies
+from utils.browser_pool import BrowserPool
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database connection parameters
-DB_URL = os.getenv('SUPABASE_URL')
-DB_PASSWORD = os.getenv('SUPABASE_PW')
-
 # Rate limiting settings
 REQUESTS_PER_MINUTE = 60  # Adjust this value based on API limits
 # Minimum time between requests in seconds
@@ -64,18 +52,10 @@ COMPANIES = [
 ]
 
 
-def setup_selenium():
-    """Set up and return a Selenium WebDriver."""
-    options = Options()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=options)
-
-
 def get_article_content(url, driver):
     """Get article content using newspaper3k with resolved URL."""
+    import newspaper
+
     try:
         driver.get(url)
         time.sleep(2)
@@ -107,6 +87,8 @@ def process_company(company_name, driver):
     logger.info(f"Processing news for: {company_name}")
     rate_limit()  # Apply rate limiting
 
+    from pygooglenews import GoogleNews
+
     gn = GoogleNews()
     search_query = f"{company_name} ESG sustainability"
     results = []
@@ -148,21 +130,8 @@ def process_company(company_name, driver):
     return results
 
 
-def connect_to_db():
-    """Establish connection to Supabase PostgreSQL database"""
-    try:
-        conn = psycopg2.connect(DB_URL)
-        conn.autocommit = False  # Use transactions
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        return None
-
-
-def insert_news_data(conn, company_name, ticker, results):
-    """Insert news data into Supabase"""
-    cursor = conn.cursor()
-
+def insert_news_data(company_name, ticker, results):
+    """Insert news data into Supabase in one batch over a pooled connection"""
     insert_query = """
         INSERT INTO sentiment_data (
             ticker, company_name, search_title, search_published, search_link,
@@ -218,28 +187,19 @@ def insert_news_data(conn, company_name, ticker, results):
             batch_data.append(data_tuple)
 
         # Execute batch insert
-        execute_batch(cursor, insert_query, batch_data)
-        conn.commit()
+        execute_many(insert_query, batch_data)
         logger.info(
             f"Successfully inserted {len(batch_data)} articles for {company_name}")
 
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error inserting data for {company_name}: {str(e)}")
         raise
-    finally:
-        cursor.close()
 
 
 def main(companies, tickers):
-    # Initialize Selenium once for all companies
-    driver = setup_selenium()
-
-    # Connect to database
-    conn = connect_to_db()
-    if not conn:
-        logger.error("Failed to connect to database. Exiting.")
-        return
+    # Start Chrome once and reuse it for all companies, with a fresh tab
+    # (or a replacement browser after a crash) for each one
+    browsers = BrowserPool(size=1)
 
     try:
         # Find the index of OPEN TEXT CORPORATION
@@ -259,12 +219,13 @@ def main(companies, tickers):
             logger.info(f"Processing {company} ({ticker})")
 
             # Process company
-            results = process_company(company, driver)
+            with browsers.browser() as driver:
+                results = process_company(company, driver)
 
             if results:
                 # Upload to Supabase
                 try:
-                    insert_news_data(conn, company, ticker, results)
+                    insert_news_data(company, ticker, results)
                 except Exception as e:
                     logger.error(
                         f"Failed to insert data for {company}: {str(e)}")
@@ -273,9 +234,7 @@ def main(companies, tickers):
             rate_limit()  # Apply rate limiting between companies
 
     finally:
-        driver.quit()
-        if conn:
-            conn.close()
+        browsers.close()
 
 
 if __name__ == "__main__":
@@ -1,213 +1,358 @@
-import pandas as pd
 import json
 import re
 import requests
-import fitz
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import concurrent.futures
-from supabase import create_client, Client
-from dotenv import load_dotenv
+import multiprocessing
+import itertools
+import functools
 import os
-import google.generativeai as genai
-import time
+import io
+import tempfile
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict
 import asyncio
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        # logging.FileHandler(
-        #     f'esg_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Suppress verbose logging from libraries
-logging.getLogger('urllib3').setLevel(logging.WARNING)
-logging.getLogger('requests').setLevel(logging.WARNING)
-logging.getLogger('PyPDF2').setLevel(logging.WARNING)
-logging.getLogger('fitz').setLevel(logging.WARNING)
-
-# Load environment variables
-load_dotenv()
-gemini_api_key = os.getenv('GEMINI_API_KEY')
-supabase_url = os.getenv('SUPABASE_STRING')
-supabase_key = os.getenv('SUPABASE_API_KEY')
-
-if not all([gemini_api_key, supabase_url, supabase_key]):
-    logging.error("Missing required environment variables")
-    raise ValueError("Missing required environment variables")
-
-# Initialize Supabase client
-try:
-    supabase: Client = create_client(supabase_url, supabase_key)
-    logging.info(
-        f"Successfully initialized Supabase client with URL: {supabase_url[:30]}...")
-except Exception as e:
-    logging.error(f"Failed to initialize Supabase client: {str(e)}")
-    raise
+import sys
+from pathlib import Path
+
+# Add the root directory to Python path
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(root_dir))
+from utils.json_stream import (aiter_response_text, extract_json_from_async_stream,
+                               extract_json_from_stream, iter_response_text)
+from utils.document_cache import DocumentCache
+from utils.text import BM25, chunk_by_tokens, split_passages, tokenize
+from utils.rate_limit import AdaptiveRateLimiter, is_throttle_error
+from utils.clients import get_gemini_model, get_supabase
+
+
+def configure_logging():
+    """Configure logging for command line runs."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            # logging.FileHandler(
+            #     f'esg_analysis_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    # Suppress verbose logging from libraries
+    logging.getLogger('urllib3').setLevel(logging.WARNING)
+    logging.getLogger('requests').setLevel(logging.WARNING)
+    logging.getLogger('PyPDF2').setLevel(logging.WARNING)
+    logging.getLogger('fitz').setLevel(logging.WARNING)
 
 # ------------------------------------------------------------
 # 2) Fetch company + URLs from 'resources'
 # ------------------------------------------------------------
-try:
-    logging.info("Fetching resources from Supabase...")
-    resources_response = supabase.table('resources').select(
-        'company, ticker, urls').execute()
-    logging.info(
-        f"Raw Response from resources table: {json.dumps(resources_response.model_dump(), indent=2)}")
 
-    if not resources_response.data:
-        raise Exception("No data returned from resources table")
 
-    resources_df = pd.DataFrame(resources_response.data)
-    logging.info(
-        f"Retrieved {len(resources_df)} records from 'resources' table")
-    logging.info(f"Sample data:\n{resources_df.head().to_string()}")
-except Exception as e:
-    logging.error(f"Failed to fetch resources: {str(e)}", exc_info=True)
-    raise
+def fetch_resources() -> List[Dict]:
+    """Fetch company, ticker and report URLs from the 'resources' table."""
+    try:
+        logging.info("Fetching resources from Supabase...")
+        resources_response = get_supabase().table('resources').select(
+            'company, ticker, urls').execute()
 
-# Display the DataFrame for debugging
-pd.set_option('display.max_colwidth', None)
-pd.options.display.colheader_justify = 'left'
-print(resources_df.to_string(index=False, justify='left'))
+        if not resources_response.data:
+            raise Exception("No data returned from resources table")
+
+        logging.info(
+            f"Retrieved {len(resources_response.data)} records from 'resources' table")
+        logging.debug(f"Sample data: {resources_response.data[:5]}")
+        return resources_response.data
+    except Exception as e:
+        logging.error(f"Failed to fetch resources: {str(e)}", exc_info=True)
+        raise
 
 # ------------------------------------------------------------
 # 3) Configure Gemini API
 # ------------------------------------------------------------
-genai.configure(api_key=gemini_api_key)
 
 # Add rate limiting decorator
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', 15))
+GEMINI_WORKERS = int(os.getenv('GEMINI_WORKERS', 4))
 
+# Shared by every thread calling Gemini; backs off when requests get a 429
+gemini_limiter = AdaptiveRateLimiter.per_minute(GEMINI_RPM)
 
-def rate_limit():
-    """Rate limit decorator to ensure we don't exceed Gemini API limits"""
-    last_call = [0.0]  # Using list to maintain state in closure
-    min_interval = 4.0  # Minimum 2 seconds between calls (15 RPM)
+
+def rate_limit(limiter):
+    """Rate limit decorator sharing an adaptive limiter across threads and tasks"""
+
+    def on_error(e):
+        if is_throttle_error(e):
+            limiter.record_throttle()
+            logging.warning(
+                f"Gemini rate limit hit, slowing to {limiter.rate * 60:.1f} requests/min")
 
     def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                waited = await limiter.acquire_async()
+                if waited >= 1:
+                    print(f"⏳ Rate limiting: Waited {waited:.1f} seconds...")
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    on_error(e)
+                    raise
+                limiter.record_success()
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            current_time = time.time()
-            elapsed = current_time - last_call[0]
-            if elapsed < min_interval:
-                sleep_time = min_interval - elapsed
-                print(f"⏳ Rate limiting: Waiting {sleep_time:.1f} seconds...")
-                time.sleep(sleep_time)
-            last_call[0] = time.time()
-            return func(*args, **kwargs)
+            waited = limiter.acquire()
+            if waited >= 1:
+                print(f"⏳ Rate limiting: Waited {waited:.1f} seconds...")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                on_error(e)
+                raise
+            limiter.record_success()
+            return result
         return wrapper
     return decorator
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    reraise=True
-)
-@rate_limit()
-def gemini_chat_completion(prompt, max_tokens, temperature):
-    model = genai.GenerativeModel('gemini-2.0-flash')
+def run_in_parallel(func, items, max_workers=GEMINI_WORKERS):
+    """Call func on every item with bounded concurrency, keeping item order."""
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+# Configure safety settings to be more permissive for business analysis
+GEMINI_SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_NONE",
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_NONE",
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_NONE",
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_NONE",
+    },
+]
+
 
-    # Configure generation parameters
-    generation_config = {
+def gemini_generation_config(max_tokens, temperature):
+    return {
         "max_output_tokens": max_tokens,
         "temperature": temperature,
         "top_p": 1,
         "top_k": 32
     }
 
-    # Configure safety settings to be more permissive for business analysis
-    safety_settings = [
-        {
-            "category": "HARM_CATEGORY_HARASSMENT",
-            "threshold": "BLOCK_NONE",
-        },
-        {
-            "category": "HARM_CATEGORY_HATE_SPEECH",
-            "threshold": "BLOCK_NONE",
-        },
-        {
-            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-            "threshold": "BLOCK_NONE",
-        },
-        {
-            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-            "threshold": "BLOCK_NONE",
-        },
-    ]
 
-    try:
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings,
-            stream=False
-        )
+def is_json_object(value):
+    return isinstance(value, dict)
 
-        # Log the raw response for debugging
-        logging.debug(f"Raw Gemini response: {response.text}")
 
-        # Check if response is empty or malformed
-        if not response.text or not response.text.strip():
-            raise ValueError("Empty response from Gemini API")
+def gemini_completion_result(text, json_data=None, parse_json=True):
+    """Wrap a Gemini reply in the chat-completion shape the agents expect."""
+    # Log the raw response for debugging
+    logging.debug(f"Raw Gemini response: {text}")
 
-        # Try to extract JSON from the response
-        # Look for JSON block in markdown format
-        json_match = re.search(r"```json\s*(.*?)\s*```",
-                               response.text, re.DOTALL)
+    # Check if response is empty or malformed
+    if not text or not text.strip():
+        raise ValueError("Empty response from Gemini API")
+
+    if json_data is not None:
+        return {"choices": [{"message": {"content": json_data}}]}
+
+    if parse_json:
+        # The streaming extractor rejects objects nested under a stray
+        # bracket in the prose, so fall back to a fenced JSON block and
+        # then to the whole reply
+        json_match = re.search(r"```json\s*(.*?)\s*```", text, re.DOTALL)
         if json_match:
             try:
                 return {"choices": [{"message": {"content": json.loads(json_match.group(1))}}]}
             except json.JSONDecodeError:
                 logging.error(
                     f"Failed to parse JSON from markdown block: {json_match.group(1)}")
-
-        # If no JSON block found or parsing failed, try to parse the entire response
         try:
-            json_data = json.loads(response.text)
-            return {"choices": [{"message": {"content": json_data}}]}
+            return {"choices": [{"message": {"content": json.loads(text)}}]}
         except json.JSONDecodeError:
-            logging.error(f"Failed to parse response as JSON: {response.text}")
-            # Return the raw text as fallback
-            return {"choices": [{"message": {"content": response.text}}]}
+            pass
+        logging.error(f"Failed to parse response as JSON: {text}")
+    # Return the raw text as fallback
+    return {"choices": [{"message": {"content": text}}]}
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    reraise=True
+)
+@rate_limit(gemini_limiter)
+def gemini_chat_completion(prompt, max_tokens, temperature, parse_json=True):
+    model = get_gemini_model('gemini-2.0-flash')
+
+    try:
+        response = model.generate_content(
+            prompt,
+            generation_config=gemini_generation_config(
+                max_tokens, temperature),
+            safety_settings=GEMINI_SAFETY_SETTINGS,
+            stream=True
+        )
+
+        if not parse_json:
+            return gemini_completion_result("".join(iter_response_text(response)),
+                                            parse_json=False)
+
+        # Stop reading as soon as the top-level JSON object is complete
+        json_data, text = extract_json_from_stream(
+            iter_response_text(response), predicate=is_json_object, top_level_only=True)
+        return gemini_completion_result(text, json_data)
 
     except Exception as e:
         logging.error(f"Gemini API Error: {str(e)}")
         raise
 
 
-print("Using Gemini API directly with model: gemini-2.0-flash-lite-001")
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+    reraise=True
+)
+@rate_limit(gemini_limiter)
+async def gemini_chat_completion_async(prompt, max_tokens, temperature, parse_json=True):
+    """Non-blocking gemini_chat_completion for the asyncio pipeline."""
+    model = get_gemini_model('gemini-2.0-flash')
+
+    try:
+        response = await model.generate_content_async(
+            prompt,
+            generation_config=gemini_generation_config(
+                max_tokens, temperature),
+            safety_settings=GEMINI_SAFETY_SETTINGS,
+            stream=True
+        )
+
+        if not parse_json:
+            text = "".join([chunk async for chunk in aiter_response_text(response)])
+            return gemini_completion_result(text, parse_json=False)
+
+        json_data, text = await extract_json_from_async_stream(
+            aiter_response_text(response), predicate=is_json_object, top_level_only=True)
+        return gemini_completion_result(text, json_data)
+
+    except Exception as e:
+        logging.error(f"Gemini API Error: {str(e)}")
+        raise
+
 
 # ------------------------------------------------------------
 # 4) Helper functions for chunking & aggregation
 # ------------------------------------------------------------
-CHUNK_SIZE = 100000
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 25000))  # about the old 100,000 characters
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 200))
 
 
-def chunk_text(text, chunk_size=CHUNK_SIZE):
-    """Yield successive chunks of text."""
-    for i in range(0, len(text), chunk_size):
-        yield text[i:i + chunk_size]
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Lazily yield token-budgeted chunks split at page and paragraph boundaries."""
+    return chunk_by_tokens(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+
+ESG_PILLARS = {
+    "Environmental": ["Carbon Emissions", "Energy Use", "Water Usage", "Waste Management", "Climate Risk Disclosures"],
+    "Social": ["Labour Practices", "Diversity & Inclusion", "Community Impact", "Product/Service Responsibility", "Human Rights"],
+    "Governance": ["Board Composition", "Executive Compensation", "Transparency", "Regulatory Compliance", "Ethical Practices", "Governance Risk"]
+}
+
+# Extra search terms per breakdown category, used to rank report passages
+CATEGORY_TERMS = {
+    "Carbon Emissions": "ghg greenhouse gas scope co2 carbon emission emissions tonnes net zero decarbonization",
+    "Energy Use": "energy electricity renewable renewables solar wind fuel efficiency consumption gj mwh",
+    "Water Usage": "water withdrawal withdrawals consumption discharge wastewater",
+    "Waste Management": "waste recycling recycled landfill diversion circular hazardous packaging",
+    "Climate Risk Disclosures": "climate tcfd scenario physical transition risks resilience adaptation",
+    "Labour Practices": "employee employees workforce health safety injury training turnover wages",
+    "Diversity & Inclusion": "diversity inclusion women gender equity indigenous representation",
+    "Community Impact": "community communities donations volunteering investment local stakeholders",
+    "Product/Service Responsibility": "customer customers product quality safety privacy satisfaction",
+    "Human Rights": "human rights supply chain suppliers modern slavery child labour",
+    "Board Composition": "board directors independent independence chair committee",
+    "Executive Compensation": "executive compensation remuneration pay incentive bonus",
+    "Transparency": "disclosure disclosures reporting gri sasb assurance audit",
+    "Regulatory Compliance": "compliance regulatory regulations fines penalties legal",
+    "Ethical Practices": "ethics ethical code conduct anti corruption bribery whistleblower",
+    "Governance Risk": "risk management enterprise oversight controls cybersecurity"
+}
+
+PILLAR_KEYWORDS = {
+    pillar: set(tokenize(" ".join(cats + [CATEGORY_TERMS.get(cat, "") for cat in cats])))
+    for pillar, cats in ESG_PILLARS.items()
+}
+
+PROMPT_TEXT_CHARS = 100000
+
+
+def select_relevant_text(text, budget=PROMPT_TEXT_CHARS):
+    """
+    Keep the passages most relevant to the ESG pillars within budget chars.
+    Passages are ranked per pillar with BM25 and taken round-robin so every
+    pillar is covered. Budget left after that is filled with the remaining
+    passages in document order (keeping e.g. the company name and headers),
+    and the selection is returned in document order.
+    """
+    if len(text) <= budget:
+        return text
+
+    passages = split_passages(text)
+    bm25 = BM25(passages)
+    rankings = []
+    for keywords in PILLAR_KEYWORDS.values():
+        scores = bm25.scores(keywords)
+        rankings.append([idx for idx in sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+                         if scores[idx] > 0])
+
+    selected, used = set(), 0
+    ranked_first = itertools.chain.from_iterable(itertools.zip_longest(*rankings))
+    for idx in itertools.chain(ranked_first, range(len(passages))):
+        if idx is None or idx in selected:
+            continue
+        cost = len(passages[idx]) + 2  # blank line separator
+        if used + cost <= budget:
+            selected.add(idx)
+            used += cost
+
+    if not selected:
+        return text[:budget]
+    logging.info(
+        f"Selected {len(selected)} of {len(passages)} passages ({used} of {len(text)} characters)")
+    return "\n\n".join(passages[idx] for idx in sorted(selected))
 
 
 def aggregate_raw_metrics(results):
     """Aggregate ESG metrics from all chunks."""
-    pillars = {
-        "Environmental": ["Carbon Emissions", "Energy Use", "Water Usage", "Waste Management", "Climate Risk Disclosures"],
-        "Social": ["Labour Practices", "Diversity & Inclusion", "Community Impact", "Product/Service Responsibility", "Human Rights"],
-        "Governance": ["Board Composition", "Executive Compensation", "Transparency", "Regulatory Compliance", "Ethical Practices", "Governance Risk"]
-    }
     aggregated = {pillar: {cat: [] for cat in cats}
-                  for pillar, cats in pillars.items()}
+                  for pillar, cats in ESG_PILLARS.items()}
 
     for res in results:
         if isinstance(res, dict) and "ESG Metrics" in res:
-            for pillar, cats in pillars.items():
+            for pillar, cats in ESG_PILLARS.items():
                 for cat in cats:
                     data = res["ESG Metrics"].get(
                         pillar, {}).get(cat, "").strip()
@@ -225,74 +370,375 @@ def aggregate_raw_metrics(results):
 # ------------------------------------------------------------
 
 
+DOWNLOAD_TIMEOUT = (10, 120)  # connect, read (seconds)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', os.cpu_count() or 1))
+PIPELINE_CONCURRENCY = int(os.getenv('PIPELINE_CONCURRENCY', 4))  # companies in flight
+# Re-analyze reports older than this many days; unset to never re-analyze
+ANALYSIS_MAX_AGE_DAYS = float(os.environ['ANALYSIS_MAX_AGE_DAYS']) \
+    if os.getenv('ANALYSIS_MAX_AGE_DAYS') else None
+SPOOL_THRESHOLD = 64 * 1024 * 1024  # larger PDFs are spooled to a private temp file
+PAGES_PER_SHARD = int(os.getenv('PDF_PAGES_PER_SHARD', 25))
+DOWNLOAD_ATTEMPTS = 3
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+
+@functools.lru_cache(maxsize=None)
+def get_document_cache():
+    """Downloaded reports and their extracted text, revalidated with conditional GETs"""
+    return DocumentCache(os.getenv('DOCUMENT_CACHE_DIR', '.cache/documents'))
+
+
+def create_http_session(pool_size=10):
+    """Create a requests session that reuses pooled connections and retries transient errors."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=DOWNLOAD_ATTEMPTS, backoff_factor=1,
+                          status_forcelist=sorted(RETRY_STATUSES))
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def extraction_pool(max_workers):
+    """
+    Process pool for PDF extraction. Workers are spawned rather than forked
+    because the pool is created while download and to_thread threads are
+    running, and a forked child could inherit a lock one of them holds.
+    Spawned workers re-import this script, so importing it must not create
+    clients, caches or query Supabase.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def open_pdf(source):
+    """Open a PDF held in memory (bytes) or spooled to disk (path)."""
+    import fitz  # imported on first use, e.g. in each extraction worker
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def describe_source(source):
+    if isinstance(source, (bytes, bytearray)):
+        return f"in-memory PDF ({len(source)} bytes)"
+    return source
+
+
+def extract_page_range(source, start, stop):
+    """
+    Extract (page number, text) pairs for pages [start, stop), skipping pages
+    without a text layer. Module level so every worker process can open the
+    document independently.
+    """
+    doc = open_pdf(source)
+    try:
+        pages = []
+        for number in range(start, min(stop, doc.page_count)):
+            text = doc.load_page(number).get_text("text")
+            if text.strip():
+                pages.append((number + 1, text))
+        return pages
+    finally:
+        doc.close()
+
+
+def page_shards(page_count, pages_per_shard=PAGES_PER_SHARD):
+    """Split a document into contiguous page ranges."""
+    return [(start, min(start + pages_per_shard, page_count))
+            for start in range(0, page_count, pages_per_shard)]
+
+
+def count_pages(source):
+    doc = open_pdf(source)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def join_pages(pages):
+    """
+    Join (page number, text) pairs into one text, separating pages with a
+    form feed. Returns the text and a list of {'page', 'start', 'end'}
+    character offsets, one per page.
+    """
+    parts, offsets, position = [], [], 0
+    for number, text in pages:
+        if parts:
+            position += 1  # form feed separator
+        offsets.append(
+            {'page': number, 'start': position, 'end': position + len(text)})
+        parts.append(text)
+        position += len(text)
+    return "\f".join(parts), offsets
+
+
+def extract_pdf_pages(source):
+    """Extract text and page offsets from a PDF in the current process."""
+    try:
+        text, offsets = join_pages(
+            extract_page_range(source, 0, count_pages(source)))
+        logging.info(
+            f"Extracted {len(text)} characters from {len(offsets)} pages of {describe_source(source)}")
+        return text, offsets
+    except Exception as e:
+        logging.error(
+            f"Error extracting text from {describe_source(source)}: {str(e)}")
+        return "", []
+
+
+def extract_pdf_text(source):
+    """Extract text from a PDF."""
+    return extract_pdf_pages(source)[0]
+
+
+class DownloadBuffer:
+    """Collects a download in memory, continuing in a private temp file past SPOOL_THRESHOLD."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.spool = None
+
+    def needs_disk(self, chunk):
+        """Whether writing chunk goes to (or starts) the spool file"""
+        return self.spool is not None or self.buffer.tell() + len(chunk) > SPOOL_THRESHOLD
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if self.spool is None and self.needs_disk(chunk):
+            # Very large report: continue on disk in a private file
+            self.spool = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            self.spool.write(self.buffer.getvalue())
+        if self.spool is not None:
+            self.spool.write(chunk)
+        else:
+            self.buffer.write(chunk)
+
+    def result(self):
+        """The downloaded bytes, or the spool file path for large downloads"""
+        if self.spool is not None:
+            self.spool.close()
+            return self.spool.name
+        return self.buffer.getvalue()
+
+    def discard(self):
+        """Drop a failed download, deleting its spool file if there is one"""
+        self.buffer = io.BytesIO()
+        if self.spool is not None:
+            self.spool.close()
+            try:
+                os.remove(self.spool.name)
+            except FileNotFoundError:
+                pass
+            self.spool = None
+
+
 class PDFExtractorAgent:
     """
     🚀 PDF Extractor Agent
-    - Downloads PDFs from URLs.
-    - Extracts text using PyMuPDF.
-    - Returns a list of raw texts (one per PDF).
+    - Downloads PDFs from URLs over a pooled HTTP session into memory.
+    - Extracts text using PyMuPDF, sharding large PDFs by page range across
+      a process pool when concurrent.
+    - Returns the combined text of all PDFs, in URL order, and records in
+      page_map where each page starts and ends in that text.
     """
 
-    def download_pdf(self, url, filename):
+    def __init__(self, max_workers=1, cache=None):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.page_map = []
+
+    @functools.cached_property
+    def session(self):
+        """Pooled requests session, created on first use (the asyncio path never needs it)"""
+        return create_http_session(pool_size=max(self.max_workers, 4))
+
+    def _read_body(self, response):
+        """
+        Read a PDF response into memory. Returns the bytes, or the path of
+        a private spool file for PDFs larger than SPOOL_THRESHOLD.
+        """
+        body = DownloadBuffer()
+        try:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                body.write(chunk)
+        except Exception:
+            body.discard()
+            raise
+        return body.result()
+
+    def download_pdf(self, url):
+        """
+        Download a PDF, revalidating the cached copy with a conditional GET.
+        Returns (source, cached_text): cached_text is set when the document
+        is unchanged and its text was already extracted, otherwise source
+        holds the PDF bytes or spool path (None on failure).
+        """
+        headers = self.cache.conditional_headers(url) if self.cache else {}
+        source = None
         try:
-            response = requests.get(url, stream=True)
-            if response.status_code == 200:
-                with open(filename, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=1024):
-                        if chunk:
-                            f.write(chunk)
+            with self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT,
+                                  headers=headers) as response:
+                if response.status_code == 304:
+                    logging.info(f"Cached PDF still valid for {url}")
+                    cached_text = self.cache.load_text(url)
+                    if cached_text is not None:
+                        return None, cached_text
+                    return self.cache.load_bytes(url), None
+
+                if response.status_code != 200:
+                    logging.error(
+                        f"Failed to download PDF from {url}: {response.status_code}")
+                    return None, None
+
+                source = self._read_body(response)
                 logging.info(f"Downloaded PDF from {url}")
-                return filename
-            else:
-                logging.error(
-                    f"Failed to download PDF from {url}: {response.status_code}")
-                return None
+                if self.cache:
+                    self.cache.store(url, source,
+                                     etag=response.headers.get('ETag'),
+                                     last_modified=response.headers.get('Last-Modified'))
+                return source, None
         except Exception as e:
             logging.error(f"Error downloading PDF from {url}: {str(e)}")
-            return None
-
-    def extract_text_from_pdf(self, pdf_path):
+            self.cleanup_pdf(source)
+            return None, None
+
+    async def download_pdf_async(self, session, url):
+        """aiohttp counterpart of download_pdf, returning (source, cached_text)."""
+        headers = await asyncio.to_thread(
+            self.cache.conditional_headers, url) if self.cache else {}
+        for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+            body = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        logging.info(f"Cached PDF still valid for {url}")
+                        cached_text = await asyncio.to_thread(self.cache.load_text, url)
+                        if cached_text is not None:
+                            return None, cached_text
+                        return await asyncio.to_thread(self.cache.load_bytes, url), None
+
+                    if response.status in RETRY_STATUSES and attempt < DOWNLOAD_ATTEMPTS:
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=response.status)
+                    if response.status != 200:
+                        logging.error(
+                            f"Failed to download PDF from {url}: {response.status}")
+                        return None, None
+
+                    body = DownloadBuffer()
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                        # Spooled writes hit the disk, so keep them off the event loop
+                        if body.needs_disk(chunk):
+                            await asyncio.to_thread(body.write, chunk)
+                        else:
+                            body.write(chunk)
+                    source = body.result()
+                    logging.info(f"Downloaded PDF from {url}")
+                    if self.cache:
+                        await asyncio.to_thread(self.cache.store, url, source,
+                                                response.headers.get('ETag'),
+                                                response.headers.get('Last-Modified'))
+                    return source, None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if body:
+                    body.discard()
+                if attempt == DOWNLOAD_ATTEMPTS:
+                    logging.error(
+                        f"Error downloading PDF from {url}: {str(e)}")
+                    return None, None
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                if body:
+                    body.discard()
+                logging.error(f"Error downloading PDF from {url}: {str(e)}")
+                return None, None
+        return None, None
+
+    async def extract_async(self, source, executor):
+        """
+        Extract a downloaded PDF on executor without blocking the event loop,
+        sharding documents longer than PAGES_PER_SHARD pages by page range.
+        Returns (document, complete); complete is False if any shard failed.
+        """
+        loop = asyncio.get_running_loop()
         try:
-            doc = fitz.open(pdf_path)
-            text = "\n".join(page.get_text("text") for page in doc)
-            doc.close()
-            text_length = len(text)
-            logging.info(f"Extracted {text_length} characters from {pdf_path}")
-            return text
+            ranges = page_shards(await asyncio.to_thread(count_pages, source))
         except Exception as e:
-            logging.error(f"Error extracting text from {pdf_path}: {str(e)}")
-            return ""
-
-    def cleanup_pdf(self, pdf_path):
-        """Delete a temporary PDF file after processing."""
+            logging.error(f"Error opening {describe_source(source)}: {str(e)}")
+            await asyncio.to_thread(self.cleanup_pdf, source)
+            return None, False
+        if len(ranges) > 1 and not isinstance(source, str):
+            source = await asyncio.to_thread(self._spool_to_disk, source)
+
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, extract_page_range, source, start, stop)
+              for start, stop in ranges),
+            return_exceptions=True)
+        pages = []
+        complete = True
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(
+                    f"Error extracting pages from {describe_source(source)}: {str(result)}")
+                complete = False
+                continue
+            pages.extend(result)
+        await asyncio.to_thread(self.cleanup_pdf, source)
+        return join_pages(pages), complete
+
+    def extract_text_from_pdf(self, source):
+        return extract_pdf_text(source)
+
+    def _spool_to_disk(self, data):
+        """Write an in-memory PDF to a private file so shards don't each copy it."""
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+            spool.write(data)
+        return spool.name
+
+    def cleanup_pdf(self, source):
+        """Delete a spooled PDF file after processing."""
+        if not isinstance(source, str):
+            return
         try:
-            if pdf_path and os.path.exists(pdf_path):
-                os.remove(pdf_path)
-                logging.debug(f"Cleaned up {pdf_path}")
+            if os.path.exists(source):
+                os.remove(source)
+                logging.debug(f"Cleaned up {source}")
         except Exception as e:
-            logging.warning(f"Could not delete {pdf_path}: {str(e)}")
-
-    def process(self, urls):
-        """Process a list of URLs and return combined extracted text."""
-        extracted_texts = []
-        os.makedirs("temp", exist_ok=True)
-
-        for idx, url in enumerate(urls):
-            filename = f"temp/document_{idx+1}.pdf"
-            pdf_path = self.download_pdf(url, filename)
-            if pdf_path:
-                text = self.extract_text_from_pdf(pdf_path)
-                if text:
-                    extracted_texts.append(text)
-                self.cleanup_pdf(pdf_path)
-
-        try:
-            os.rmdir("temp")
-            logging.debug("Cleaned up temp directory")
-        except:
-            pass
-
-        combined_text = "\n\n".join(extracted_texts) if extracted_texts else ""
+            logging.warning(f"Could not delete {source}: {str(e)}")
+
+    def _cache_document(self, url, document):
+        if self.cache and document[0]:
+            self.cache.store_text(url, *document)
+
+    def _cached_document(self, url, text):
+        offsets = self.cache.load_pages(url) if self.cache else None
+        return text, offsets or []
+
+    def _combine_texts(self, documents, urls):
+        """Join extracted documents and map each page to its span in the result."""
+        self.page_map = []
+        parts, position = [], 0
+        for url, document in zip(urls, documents):
+            if not document or not document[0]:
+                continue
+            text, offsets = document
+            if parts:
+                position += 2  # blank line separator
+            self.page_map.extend({'url': url, 'page': o['page'],
+                                  'start': position + o['start'],
+                                  'end': position + o['end']} for o in offsets)
+            parts.append(text)
+            position += len(text)
+
+        combined_text = "\n\n".join(parts)
         if combined_text:
             logging.info(
                 f"Successfully extracted {len(combined_text)} total characters from {len(urls)} PDFs")
@@ -300,13 +746,115 @@ class PDFExtractorAgent:
             logging.warning("No text was extracted from PDFs")
         return combined_text
 
+    def process(self, urls):
+        """Process a list of URLs and return combined extracted text."""
+        if self.max_workers > 1:
+            return self.process_concurrent(urls)
+
+        documents = []
+        for url in urls:
+            source, text = self.download_pdf(url)
+            if source:
+                document = extract_pdf_pages(source)
+                self._cache_document(url, document)
+                self.cleanup_pdf(source)
+            elif text:
+                document = self._cached_document(url, text)
+            else:
+                document = None
+            documents.append(document)
+
+        return self._combine_texts(documents, urls)
+
+    def process_concurrent(self, urls):
+        """
+        Download PDFs on a thread pool and extract their text on a process
+        pool as each download finishes. Documents longer than PAGES_PER_SHARD
+        pages are split into page ranges that are extracted in parallel.
+        Texts are reassembled in URL and page order.
+        """
+        documents = [None] * len(urls)
+        shards = {}  # idx -> (source, list of shard results)
+        incomplete = set()  # idx of documents with a failed shard
+        extract_workers = min(self.max_workers, os.cpu_count() or 1)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as downloads, \
+                extraction_pool(extract_workers) as extractors:
+            download_futures = {downloads.submit(self.download_pdf, url): idx
+                                for idx, url in enumerate(urls)}
+            extract_futures = {}
+            for future in concurrent.futures.as_completed(download_futures):
+                idx = download_futures[future]
+                source, text = future.result()
+                if text:
+                    documents[idx] = self._cached_document(urls[idx], text)
+                if not source:
+                    continue
+                try:
+                    ranges = page_shards(count_pages(source))
+                except Exception as e:
+                    logging.error(
+                        f"Error opening {describe_source(source)}: {str(e)}")
+                    self.cleanup_pdf(source)
+                    continue
+                if len(ranges) > 1 and not isinstance(source, str):
+                    source = self._spool_to_disk(source)
+                shards[idx] = (source, [None] * len(ranges))
+                for shard, (start, stop) in enumerate(ranges):
+                    extract_futures[extractors.submit(
+                        extract_page_range, source, start, stop)] = (idx, shard)
+
+            for future in concurrent.futures.as_completed(extract_futures):
+                idx, shard = extract_futures[future]
+                source, results = shards[idx]
+                try:
+                    results[shard] = future.result()
+                except Exception as e:
+                    logging.error(
+                        f"Error extracting pages from {describe_source(source)}: {str(e)}")
+                    results[shard] = []
+                    incomplete.add(idx)
+
+        for idx, (source, results) in shards.items():
+            document = join_pages(
+                [page for pages in results for page in pages])
+            logging.info(
+                f"Extracted {len(document[0])} characters from {len(document[1])} pages of {urls[idx]}")
+            documents[idx] = document
+            # Partial text is still used for this run but never cached, so
+            # the next run re-extracts instead of serving it after a 304
+            if idx not in incomplete:
+                self._cache_document(urls[idx], document)
+            self.cleanup_pdf(source)
+
+        return self._combine_texts(documents, urls)
+
+    async def process_async(self, urls, session, executor):
+        """
+        Asyncio version of process: downloads with a shared aiohttp session
+        and extracts on executor as each download finishes.
+        """
+        async def fetch_document(url):
+            source, text = await self.download_pdf_async(session, url)
+            if source:
+                document, complete = await self.extract_async(source, executor)
+                if document and complete:
+                    await asyncio.to_thread(self._cache_document, url, document)
+                return document
+            if text:
+                return await asyncio.to_thread(self._cached_document, url, text)
+            return None
+
+        documents = await asyncio.gather(*(fetch_document(url) for url in urls))
+        return self._combine_texts(documents, urls)
+
 
 class ESGAnalystAgent:
     """
     🚀 ESG Analyst Agent
-    - Splits the combined text into chunks.
-    - Processes each chunk in parallel via DeepSeek API.
-    - Returns a list of ESG metrics (one per chunk).
+    - Splits the combined text into token-budgeted chunks at page and paragraph breaks.
+    - Processes chunks in parallel via the Gemini API (bounded by max_workers).
+    - Returns a list of ESG metrics (one per chunk, in chunk order).
     """
     json_format = '''```json
 {
@@ -337,6 +885,9 @@ class ESGAnalystAgent:
 }
 ```'''
 
+    def __init__(self, max_workers=GEMINI_WORKERS):
+        self.max_workers = max_workers
+
     def extract_esg_metrics_from_chunk(self, text_chunk):
         prompt = f"""
 You are an expert ESG analyst with exceptional ability to extract key ESG performance metrics from corporate reports. Analyze the following text and extract all available explicit data—including both quantitative figures (numbers, percentages, targets) and key qualitative statements—that indicate performance for ESG scoring.
@@ -387,26 +938,26 @@ Return your answer in JSON format exactly as follows:
             print("❌ Gemini API Error:", e)
             return None
 
+    def _process_chunk(self, indexed_chunk):
+        idx, chunk = indexed_chunk
+        try:
+            result = self.extract_esg_metrics_from_chunk(chunk)
+            if isinstance(result, dict):
+                print(
+                    f"✅ ESG Metrics for chunk {idx+1}:\n{json.dumps(result, indent=2)}")
+            else:
+                print(f"✅ ESG Metrics for chunk {idx+1} (raw):\n{result}")
+            return result
+        except Exception as e:
+            print(f"❌ Error processing chunk {idx+1}: {str(e)}")
+            return None
+
     def process(self, combined_text):
-        esg_results = []
         chunks = list(chunk_text(combined_text))
         print(f"📌 Total chunks to process: {len(chunks)}")
 
-        # Process chunks sequentially to avoid rate limits
-        for idx, chunk in enumerate(chunks):
-            try:
-                result = self.extract_esg_metrics_from_chunk(chunk)
-                esg_results.append(result)
-                if isinstance(result, dict):
-                    print(
-                        f"✅ ESG Metrics for chunk {idx+1}:\n{json.dumps(result, indent=2)}")
-                else:
-                    print(f"✅ ESG Metrics for chunk {idx+1} (raw):\n{result}")
-            except Exception as e:
-                print(f"❌ Error processing chunk {idx+1}: {str(e)}")
-                esg_results.append(None)
-
-        return esg_results
+        # Calls share gemini_limiter, so concurrency never exceeds the rate limit
+        return run_in_parallel(self._process_chunk, enumerate(chunks), self.max_workers)
 
 
 class ReportSummarizerAgent:
@@ -417,6 +968,9 @@ class ReportSummarizerAgent:
     - Processes each pillar in parallel.
     """
 
+    def __init__(self, max_workers=GEMINI_WORKERS):
+        self.max_workers = max_workers
+
     def generate_pillar_summary(self, pillar_name, pillar_data):
         summary_prompt_content = f"For the {pillar_name} pillar, use the following aggregated metrics as context:\n"
         for category, metrics in pillar_data.items():
@@ -435,22 +989,27 @@ Provide only the summary text.
 """
         try:
             response = gemini_chat_completion(
-                prompt, max_tokens=1200, temperature=0.2)
+                prompt, max_tokens=1200, temperature=0.2, parse_json=False)
             return response["choices"][0]["message"]["content"].strip()
         except Exception as e:
             print("❌ Error generating pillar summary:", e)
             return "Summary not available."
 
+    def _summarize_pillar(self, item):
+        pillar, data = item
+        try:
+            summary = self.generate_pillar_summary(pillar, data)
+            print(f"✅ Summary generated for {pillar} pillar.")
+            return summary
+        except Exception as e:
+            print(f"❌ Error generating summary for {pillar}: {str(e)}")
+            return "Summary not available."
+
     def process(self, aggregated_metrics):
-        summaries = {}
-        for pillar, data in aggregated_metrics.items():
-            try:
-                summaries[pillar] = self.generate_pillar_summary(pillar, data)
-                print(f"✅ Summary generated for {pillar} pillar.")
-            except Exception as e:
-                print(f"❌ Error generating summary for {pillar}: {str(e)}")
-                summaries[pillar] = "Summary not available."
-        return summaries
+        pillars = list(aggregated_metrics.items())
+        summaries = run_in_parallel(
+            self._summarize_pillar, pillars, self.max_workers)
+        return {pillar: summary for (pillar, _), summary in zip(pillars, summaries)}
 
 
 class KeyMetricsBreakdownAgent:
@@ -459,8 +1018,12 @@ class KeyMetricsBreakdownAgent:
     - Generates a structured breakdown for each ESG metric.
     - Suggests scoring benchmarks for future ESG evaluations.
     - Returns the breakdowns in JSON format.
+    - Processes each pillar in parallel.
     """
 
+    def __init__(self, max_workers=GEMINI_WORKERS):
+        self.max_workers = max_workers
+
     def generate_key_metric_breakdown(self, pillar_name, pillar_data):
         breakdown_prompt_content = f"For the {pillar_name} pillar, analyze the following key metrics and provide a detailed breakdown for each metric. For each category, describe the available quantitative and qualitative data, discuss its implications, and suggest how it might be used to score the pillar in future analyses. Return your output in JSON format where each key is the category name and the value is a string with the detailed breakdown.\n"
         for category, metrics in pillar_data.items():
@@ -501,18 +1064,22 @@ Provide only the JSON output.
             print("❌ Error generating key metrics breakdown:", e)
             return None
 
+    def _breakdown_pillar(self, item):
+        pillar, data = item
+        try:
+            breakdown = self.generate_key_metric_breakdown(pillar, data)
+            print(
+                f"✅ Key metrics breakdown generated for {pillar} pillar.")
+            return breakdown
+        except Exception as e:
+            print(f"❌ Error generating breakdown for {pillar}: {str(e)}")
+            return None
+
     def process(self, aggregated_metrics):
-        breakdowns = {}
-        for pillar, data in aggregated_metrics.items():
-            try:
-                breakdowns[pillar] = self.generate_key_metric_breakdown(
-                    pillar, data)
-                print(
-                    f"✅ Key metrics breakdown generated for {pillar} pillar.")
-            except Exception as e:
-                print(f"❌ Error generating breakdown for {pillar}: {str(e)}")
-                breakdowns[pillar] = None
-        return breakdowns
+        pillars = list(aggregated_metrics.items())
+        breakdowns = run_in_parallel(
+            self._breakdown_pillar, pillars, self.max_workers)
+        return {pillar: breakdown for (pillar, _), breakdown in zip(pillars, breakdowns)}
 
 # ------------------------------------------------------------
 # 6) ESG pipeline function
@@ -634,7 +1201,7 @@ You MUST respond with ONLY a JSON object matching this exact structure:
 }}
 
 Text to analyze:
-{text[:100000]}"""
+{select_relevant_text(text)}"""
 
 
 async def analyze_with_gemini(text: str, company: str) -> Dict:
@@ -642,8 +1209,10 @@ async def analyze_with_gemini(text: str, company: str) -> Dict:
     logging.info(f"Starting Gemini analysis for {company}")
 
     try:
-        response = gemini_chat_completion(
-            prompt=generate_analysis_prompt(text, company),
+        # Passage ranking is CPU bound, keep it off the event loop
+        prompt = await asyncio.to_thread(generate_analysis_prompt, text, company)
+        response = await gemini_chat_completion_async(
+            prompt=prompt,
             max_tokens=2000,
             temperature=0.2
         )
@@ -716,32 +1285,55 @@ async def analyze_with_gemini(text: str, company: str) -> Dict:
         raise
 
 
-async def run_esg_pipeline(resources: List[Dict]) -> Dict:
-    """Run the ESG analysis pipeline for the given resources."""
-    logging.info(f"Starting ESG pipeline for {len(resources)} resources")
-
-    for resource in resources:
-        ticker = resource['ticker']
-        company = resource['company']
-
+def load_analyzed_tickers(tickers: List[str], page_size: int = 1000) -> Dict[str, str]:
+    """
+    Fetch ticker -> created_at for every ticker that already has a row in
+    esg_report_analysis, paging past the PostgREST row limit in (ticker, id) order.
+    """
+    analyzed = {}
+    start = 0
+    while tickers:
+        # A stable order keeps rows from shifting between pages
+        page = get_supabase().table('esg_report_analysis').select('ticker, created_at').in_(
+            'ticker', tickers).order('ticker').order('id').range(
+            start, start + page_size - 1).execute().data
+        analyzed.update((row['ticker'], row.get('created_at')) for row in page)
+        if len(page) < page_size:
+            break
+        start += page_size
+    return analyzed
+
+
+def is_stale(created_at, max_age_days=ANALYSIS_MAX_AGE_DAYS):
+    """Whether an existing analysis is older than max_age_days (None: never stale)."""
+    if max_age_days is None:
+        return False
+    if not created_at:
+        return True
+    created = datetime.fromisoformat(created_at)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created > timedelta(days=max_age_days)
+
+
+async def process_resource(resource: Dict, session, executor, semaphore) -> None:
+    """Extract, analyze and store one company, at most `semaphore` at a time."""
+    ticker = resource['ticker']
+    company = resource['company']
+
+    async with semaphore:
         try:
-            # Check if record exists
-            existing_record = supabase.table('esg_report_analysis').select(
-                "*").eq('ticker', ticker).execute()
-
-            if existing_record.data:
-                logging.info(f"Skipping {ticker} - record already exists")
-                continue
-
             logging.info(f"Processing {ticker} - {company}")
 
             # Extract text from PDFs
-            pdf_extractor = PDFExtractorAgent()
-            combined_text = pdf_extractor.process(resource['urls'])
+            pdf_extractor = PDFExtractorAgent(max_workers=PDF_WORKERS,
+                                              cache=get_document_cache())
+            combined_text = await pdf_extractor.process_async(
+                resource['urls'], session, executor)
 
             if not combined_text:
                 logging.warning(f"Skipping {ticker} - no text extracted")
-                continue
+                return
 
             # Analyze with Gemini
             analysis = await analyze_with_gemini(combined_text, company)
@@ -761,10 +1353,11 @@ async def run_esg_pipeline(resources: List[Dict]) -> Dict:
 
             # Upsert to Supabase
             try:
-                result = supabase.table('esg_report_analysis').upsert(
-                    results,
-                    on_conflict='ticker'
-                ).execute()
+                result = await asyncio.to_thread(
+                    get_supabase().table('esg_report_analysis').upsert(
+                        results,
+                        on_conflict='ticker'
+                    ).execute)
 
                 if result.data:
                     logging.info(
@@ -776,11 +1369,39 @@ async def run_esg_pipeline(resources: List[Dict]) -> Dict:
             except Exception as e:
                 logging.error(
                     f"Failed to store analysis for {ticker}: {str(e)}")
-                continue
 
         except Exception as e:
             logging.error(f"Failed to process {ticker}: {str(e)}")
-            continue
+
+
+async def run_esg_pipeline(resources: List[Dict], concurrency: int = PIPELINE_CONCURRENCY) -> None:
+    """
+    Run the ESG analysis pipeline for the given resources. Companies are
+    processed concurrently (up to `concurrency` at once) over a shared HTTP
+    session, with PDF extraction on a shared process pool.
+    """
+    logging.info(f"Starting ESG pipeline for {len(resources)} resources")
+
+    # One query for the tickers that already have an analysis
+    analyzed = await asyncio.to_thread(
+        load_analyzed_tickers, [resource['ticker'] for resource in resources])
+    pending = []
+    for resource in resources:
+        ticker = resource['ticker']
+        if ticker in analyzed and not is_stale(analyzed[ticker]):
+            logging.info(f"Skipping {ticker} - record already exists")
+        else:
+            pending.append(resource)
+    resources = pending
+
+    semaphore = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=DOWNLOAD_TIMEOUT[0], sock_read=DOWNLOAD_TIMEOUT[1])
+    connector = aiohttp.TCPConnector(limit=max(concurrency * 4, 10))
+    with extraction_pool(PDF_WORKERS) as executor:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await asyncio.gather(*(process_resource(resource, session, executor, semaphore)
+                                   for resource in resources))
 
     logging.info("ESG pipeline completed")
 
@@ -789,7 +1410,8 @@ async def main():
     """Main entry point for the ESG analysis pipeline."""
     logging.info("Starting ESG analysis pipeline")
 
-    for idx, row in resources_df.iterrows():
+    resources = []
+    for row in await asyncio.to_thread(fetch_resources):
         company_name = row["company"]
         ticker = row["ticker"]
         pdf_urls = row["urls"]
@@ -798,19 +1420,17 @@ async def main():
             logging.warning(f"Skipping {ticker} - no URLs found")
             continue
 
-        try:
-            resource = {
-                'ticker': ticker,
-                'company': company_name,
-                'urls': pdf_urls
-            }
-            await run_esg_pipeline([resource])
-        except Exception as e:
-            logging.error(f"Failed to process {ticker}: {str(e)}")
-            continue
+        resources.append({
+            'ticker': ticker,
+            'company': company_name,
+            'urls': pdf_urls
+        })
+
+    await run_esg_pipeline(resources)
 
     logging.info("Pipeline completed")
 
 # Run the async main function
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(main())
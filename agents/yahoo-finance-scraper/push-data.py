@@ -2,16 +2,24 @@ import os
 import sys
 import json
 import time
-import subprocess
-import psycopg2
+import threading
+import importlib.util
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from datetime import datetime, date
-import pandas as pd
-import numpy as np
 from dotenv import load_dotenv
 import logging
 import argparse
 import re
+import concurrent.futures
+from pathlib import Path
+
+# Add the root directory to Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from utils.rate_limit import HostRateLimiter
+from utils.db import get_connection, init_pool
+from utils.browser_pool import get_browser_pool
 
 # Set up logging
 logging.basicConfig(
@@ -27,174 +35,82 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Database connection parameters
-DB_URL = os.getenv('SUPABASE_URL')
-DB_PASSWORD = os.getenv('SUPABASE_PW')
-
-
-def connect_to_db():
-    """Establish connection to Supabase PostgreSQL database"""
-    try:
-        conn = psycopg2.connect(DB_URL)
-        conn.autocommit = False  # Use transactions
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        return None
-
-
-def run_test_data_script(ticker):
-    """Run test-data.py for a specific ticker and return the data"""
+def upsert_rows(cur, table, columns, rows, conflict_columns, update_columns=None):
+    """
+    Write rows with a single INSERT ... ON CONFLICT statement. Conflicting
+    rows get update_columns overwritten, or are left alone if it is None.
+    """
+    if not rows:
+        return 0
+    if update_columns:
+        action = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column))
+            for column in update_columns))
+    else:
+        action = sql.SQL("DO NOTHING")
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s ON CONFLICT ({}) {}").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, columns)),
+        sql.SQL(', ').join(map(sql.Identifier, conflict_columns)),
+        action)
+    # One page, so the whole batch is one round-trip
+    execute_values(cur, query, rows, page_size=len(rows))
+    return len(rows)
+
+
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def load_collector():
+    """
+    Import collect_ticker_data from test-data.py once. The hyphenated file
+    name is not importable with a plain import statement, and concurrent
+    first callers wait for a single import.
+    """
+    global _collector
+    with _collector_lock:
+        if _collector is None:
+            path = os.path.join(os.path.dirname(
+                os.path.abspath(__file__)), 'test-data.py')
+            spec = importlib.util.spec_from_file_location('yahoo_test_data', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _collector = module.collect_ticker_data
+        return _collector
+
+
+def fetch_ticker_data(ticker, limiter=None):
+    """Collect the data for a ticker in-process, retrying with backoff"""
     max_retries = 3
     retry_delay = 5  # seconds
+    collect_ticker_data = load_collector()
 
     for attempt in range(max_retries):
         try:
-            # Save current ticker to a temporary environment variable
-            os.environ['CURRENT_TICKER'] = ticker
-
-            # Modify the test-data.py script to use the environment variable
-            # This is a temporary solution - in production, you'd modify test-data.py to accept a ticker parameter
-            original_script_path = os.path.join(
-                os.path.dirname(__file__), 'test-data.py')
-            temp_script_path = os.path.join(
-                os.path.dirname(__file__), 'temp-test-data.py')
-
-            with open(original_script_path, 'r') as f:
-                script_content = f.read()
-
-            # Replace the hardcoded ticker with the environment variable
-            modified_content = script_content.replace(
-                'ticker_symbol = "ACX.TO"',
-                'ticker_symbol = os.environ.get("CURRENT_TICKER")'
-            )
-
-            # Add timeout parameters to requests to prevent hanging
-            modified_content = modified_content.replace(
-                'response = requests.get(url)',
-                'response = requests.get(url, timeout=30)'
-            )
-
-            # Modify the JSON encoder to handle NaN values
-            modified_content = modified_content.replace(
-                'class CustomJSONEncoder(json.JSONEncoder):',
-                '''class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (date, datetime, pd.Timestamp)):
-            return obj.isoformat()
-        if isinstance(obj, pd.DataFrame):
-            return convert_keys_to_str(obj.to_dict())
-        if pd.isna(obj) or (isinstance(obj, float) and np.isnan(obj)):
-            return None
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super().default(obj)'''
-            )
-
-            with open(temp_script_path, 'w') as f:
-                f.write(modified_content)
-
-            # Run the modified script
-            logger.info(f"Running test-data.py for {ticker}")
-            result = subprocess.run([sys.executable, temp_script_path],
-                                    capture_output=True,
-                                    text=True,
-                                    check=False)
-
-            # Check if the script ran successfully
-            if result.returncode != 0:
-                logger.error(
-                    f"Error running test-data.py for {ticker}: {result.stderr}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    logger.error(
-                        f"Failed to process {ticker} after {max_retries} attempts")
-                    return None
-
-            # Clean up
-            try:
-                os.remove(temp_script_path)
-            except Exception as e:
-                logger.warning(f"Could not remove temporary script: {str(e)}")
-
-            # Read the generated JSON file
-            try:
-                with open('dat.json', 'r') as f:
-                    data = json.load(f)
-
-                # Validate the data
-                if not data or not isinstance(data, dict):
-                    logger.warning(f"Invalid data format for {ticker}")
-                    if attempt < max_retries - 1:
-                        logger.info(f"Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                        continue
-                    else:
-                        return None
+            logger.info(f"Collecting data for {ticker}")
+            data = collect_ticker_data(ticker, limiter=limiter)
 
+            # Validate the data
+            if data and isinstance(data, dict):
                 # Log what data categories we have
                 categories = list(data.keys())
                 logger.info(
                     f"Retrieved data for {ticker} with categories: {categories}")
-
                 return data
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing JSON data for {ticker}: {str(e)}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                return None
-            except FileNotFoundError:
-                logger.error(f"dat.json file not found for {ticker}")
-                if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                return None
-
-        except subprocess.CalledProcessError as e:
-            logger.error(
-                f"Error running test-data.py for {ticker} (attempt {attempt+1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-            else:
-                logger.error(
-                    f"Failed to process {ticker} after {max_retries} attempts")
-                return None
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON data for {ticker}: {str(e)}")
-            return None
-
-        except FileNotFoundError as e:
-            logger.error(f"File not found while processing {ticker}: {str(e)}")
-            return None
 
+            logger.warning(f"Invalid data format for {ticker}")
         except Exception as e:
             logger.error(
                 f"Unexpected error processing {ticker} (attempt {attempt+1}/{max_retries}): {str(e)}")
-            if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-                retry_delay *= 2  # Exponential backoff
-            else:
-                logger.error(
-                    f"Failed to process {ticker} after {max_retries} attempts")
-                return None
+
+        if attempt < max_retries - 1:
+            logger.info(f"Retrying in {retry_delay} seconds...")
+            time.sleep(retry_delay)
+            retry_delay *= 2  # Exponential backoff
+
+    logger.error(f"Failed to process {ticker} after {max_retries} attempts")
+    return None
 
 
 def insert_company_data(conn, ticker, data):
@@ -206,56 +122,31 @@ def insert_company_data(conn, ticker, data):
     info = data['Company Info']
 
     try:
+        # Extract additional fields
+        name = info.get('shortName', info.get('longName', None))
+        sector = info.get('sector', None)
+        industry = info.get('industry', None)
+        website = info.get('website', None)
+        headquarters = info.get('city', None)
+        employees = info.get('fullTimeEmployees', None)
+        long_business_summary = info.get('longBusinessSummary', None)
+        market_cap = info.get('marketCap', None)
+
+        columns = ['ticker', 'name', 'sector', 'industry', 'website', 'headquarters',
+                   'employees', 'long_business_summary', 'market_cap']
         with conn.cursor() as cur:
-            # Check if company already exists
-            cur.execute(
-                "SELECT ticker FROM companies WHERE ticker = %s", (ticker,))
-
-            # Extract additional fields
-            name = info.get('shortName', info.get('longName', None))
-            sector = info.get('sector', None)
-            industry = info.get('industry', None)
-            website = info.get('website', None)
-            headquarters = info.get('city', None)
-            employees = info.get('fullTimeEmployees', None)
-            long_business_summary = info.get('longBusinessSummary', None)
-            market_cap = info.get('marketCap', None)
-
-            if cur.fetchone():
-                logger.info(f"Company {ticker} already exists, updating...")
-                cur.execute("""
-                    UPDATE companies 
-                    SET name = %s, sector = %s, industry = %s, website = %s, 
-                        headquarters = %s, employees = %s, long_business_summary = %s, market_cap = %s
-                    WHERE ticker = %s
-                """, (
-                    name,
-                    sector,
-                    industry,
-                    website,
-                    headquarters,
-                    employees,
-                    long_business_summary,
-                    market_cap,
-                    ticker
-                ))
-            else:
-                logger.info(f"Inserting new company {ticker}")
-                cur.execute("""
-                    INSERT INTO companies 
-                    (ticker, name, sector, industry, website, headquarters, employees, long_business_summary, market_cap)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    ticker,
-                    name,
-                    sector,
-                    industry,
-                    website,
-                    headquarters,
-                    employees,
-                    long_business_summary,
-                    market_cap
-                ))
+            logger.info(f"Upserting company {ticker}")
+            upsert_rows(cur, 'companies', columns, [(
+                ticker,
+                name,
+                sector,
+                industry,
+                website,
+                headquarters,
+                employees,
+                long_business_summary,
+                market_cap
+            )], ['ticker'], columns[1:])
         return True
     except Exception as e:
         logger.error(f"Error inserting company data for {ticker}: {str(e)}")
@@ -313,104 +204,53 @@ def insert_financial_data(conn, ticker, data):
         if 'Quarterly Income Statement' in data:
             income_stmt = data['Quarterly Income Statement']
 
-            # Convert dictionary to DataFrame for easier processing
             if isinstance(income_stmt, dict):
-                # Process each date key properly
-                with conn.cursor() as cur:
-                    for date_str in income_stmt.keys():
-                        # Try to parse the date string
-                        report_date = parse_date_string(date_str)
-                        if not report_date:
-                            logger.warning(
-                                f"Skipping non-date key: {date_str}")
-                            continue
-
-                        # Get the data for this date
-                        quarter_data = income_stmt[date_str]
-
-                        # Skip if 'Net Income Continuous Operations' is missing
-                        if 'Net Income Continuous Operations' not in quarter_data:
-                            logger.warning(
-                                f"Skipping record for {ticker} on {report_date} - missing 'Net Income Continuous Operations'")
-                            continue
-
-                        # Extract relevant financial metrics
-                        revenue = quarter_data.get('Total Revenue')
-                        net_income = quarter_data.get('Net Income')
-                        ebitda = quarter_data.get('EBITDA')
-                        gross_profit = quarter_data.get('Gross Profit')
+                # One row per report date (a later duplicate date wins)
+                rows = {}
+                for date_str in income_stmt.keys():
+                    # Try to parse the date string
+                    report_date = parse_date_string(date_str)
+                    if not report_date:
+                        logger.warning(
+                            f"Skipping non-date key: {date_str}")
+                        continue
 
+                    # Get the data for this date
+                    quarter_data = income_stmt[date_str]
+
+                    # Skip if 'Net Income Continuous Operations' is missing
+                    if 'Net Income Continuous Operations' not in quarter_data:
+                        logger.warning(
+                            f"Skipping record for {ticker} on {report_date} - missing 'Net Income Continuous Operations'")
+                        continue
+
+                    rows[report_date] = (
+                        ticker,
+                        report_date,
+                        quarter_data.get('Total Revenue'),
+                        quarter_data.get('Net Income'),
+                        quarter_data.get('EBITDA'),
+                        quarter_data.get('Gross Profit'),
                         # Store the entire quarter data as JSON
-                        other_data_json = json.dumps(quarter_data)
-
-                        # Check if record already exists
-                        cur.execute("""
-                            SELECT id FROM financials 
-                            WHERE ticker = %s AND report_date = %s
-                        """, (ticker, report_date))
-
-                        if cur.fetchone():
-                            logger.info(
-                                f"Financial data for {ticker} on {report_date} already exists, updating...")
-                            cur.execute("""
-                                UPDATE financials 
-                                SET revenue = %s, net_income = %s, ebitda = %s, gross_profit = %s, other_data = %s
-                                WHERE ticker = %s AND report_date = %s
-                            """, (
-                                revenue,
-                                net_income,
-                                ebitda,
-                                gross_profit,
-                                other_data_json,
-                                ticker,
-                                report_date
-                            ))
-                        else:
-                            logger.info(
-                                f"Inserting financial data for {ticker} on {report_date}")
-                            cur.execute("""
-                                INSERT INTO financials 
-                                (ticker, report_date, revenue, net_income, ebitda, gross_profit, other_data)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            """, (
-                                ticker,
-                                report_date,
-                                revenue,
-                                net_income,
-                                ebitda,
-                                gross_profit,
-                                other_data_json
-                            ))
+                        json.dumps(quarter_data)
+                    )
+
+                columns = ['ticker', 'report_date', 'revenue', 'net_income',
+                           'ebitda', 'gross_profit', 'other_data']
+                with conn.cursor() as cur:
+                    count = upsert_rows(cur, 'financials', columns, list(rows.values()),
+                                        ['ticker', 'report_date'], columns[2:])
+                logger.info(
+                    f"Upserted {count} quarters of financial data for {ticker}")
         # If no quarterly data but we have company info, create a record with just the company info data
         elif company_info:
+            # Use today's date for the report; keep an existing record as is
+            logger.info(
+                f"Inserting minimal financial data for {ticker} from company info")
             with conn.cursor() as cur:
-                # Use today's date for the report
-                report_date = datetime.now().date()
-
-                # Check if record already exists
-                cur.execute("""
-                    SELECT id FROM financials 
-                    WHERE ticker = %s AND report_date = %s
-                """, (ticker, report_date))
-
-                if cur.fetchone():
-                    logger.info(
-                        f"Financial data for {ticker} on {report_date} already exists, but no quarterly data available")
-                else:
-                    # Store company info as other_data
-                    other_data_json = json.dumps(company_info)
-
-                    logger.info(
-                        f"Inserting minimal financial data for {ticker} from company info")
-                    cur.execute("""
-                        INSERT INTO financials 
-                        (ticker, report_date, other_data)
-                        VALUES (%s, %s, %s)
-                    """, (
-                        ticker,
-                        report_date,
-                        other_data_json
-                    ))
+                upsert_rows(cur, 'financials', ['ticker', 'report_date', 'other_data'],
+                            [(ticker, datetime.now().date(), json.dumps(company_info))],
+                            ['ticker', 'report_date'])
 
         return True
     except Exception as e:
@@ -424,69 +264,38 @@ def insert_market_data(conn, ticker, data):
     success = False
 
     try:
-        with conn.cursor() as cur:
-            # Process historical price data
-            if 'History' in data:
-                history = data['History']
-
-                # Get dates from the first available metric
-                if 'Close' in history:
-                    dates = list(history['Close'].keys())
-
-                    for date_str in dates:
-                        # Parse the date
-                        price_date = parse_date_string(date_str)
-                        if not price_date:
-                            logger.warning(
-                                f"Skipping invalid date format: {date_str}")
-                            continue
-
-                        # Get price data
-                        open_price = history.get('Open', {}).get(date_str)
-                        close_price = history.get('Close', {}).get(date_str)
-                        high_price = history.get('High', {}).get(date_str)
-                        low_price = history.get('Low', {}).get(date_str)
-                        volume = history.get('Volume', {}).get(date_str)
-
-                        # Check if record already exists
-                        cur.execute("""
-                            SELECT id FROM market_data 
-                            WHERE ticker = %s AND date = %s
-                        """, (ticker, price_date))
-
-                        if cur.fetchone():
-                            logger.info(
-                                f"Market data for {ticker} on {price_date} already exists, updating...")
-                            cur.execute("""
-                                UPDATE market_data 
-                                SET open_price = %s, close_price = %s, day_high = %s, day_low = %s, volume = %s
-                                WHERE ticker = %s AND date = %s
-                            """, (
-                                open_price,
-                                close_price,
-                                high_price,
-                                low_price,
-                                volume,
-                                ticker,
-                                price_date
-                            ))
-                        else:
-                            logger.info(
-                                f"Inserting market data for {ticker} on {price_date}")
-                            cur.execute("""
-                                INSERT INTO market_data 
-                                (ticker, date, open_price, close_price, day_high, day_low, volume)
-                                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            """, (
-                                ticker,
-                                price_date,
-                                open_price,
-                                close_price,
-                                high_price,
-                                low_price,
-                                volume
-                            ))
-                    success = True
+        # Process historical price data
+        history = data.get('History') or {}
+
+        # Get dates from the first available metric
+        if 'Close' in history:
+            # One row per trading day (a later duplicate date wins)
+            rows = {}
+            for date_str in history['Close'].keys():
+                # Parse the date
+                price_date = parse_date_string(date_str)
+                if not price_date:
+                    logger.warning(
+                        f"Skipping invalid date format: {date_str}")
+                    continue
+
+                rows[price_date] = (
+                    ticker,
+                    price_date,
+                    history.get('Open', {}).get(date_str),
+                    history.get('Close', {}).get(date_str),
+                    history.get('High', {}).get(date_str),
+                    history.get('Low', {}).get(date_str),
+                    history.get('Volume', {}).get(date_str)
+                )
+
+            columns = ['ticker', 'date', 'open_price', 'close_price',
+                       'day_high', 'day_low', 'volume']
+            with conn.cursor() as cur:
+                count = upsert_rows(cur, 'market_data', columns, list(rows.values()),
+                                    ['ticker', 'date'], columns[2:])
+            logger.info(f"Upserted {count} days of market data for {ticker}")
+            success = True
 
         return success
     except Exception as e:
@@ -510,10 +319,6 @@ def insert_esg_data(conn, ticker, data):
             historical_scores = json.dumps(data['Historical ESG Scores'])
 
         with conn.cursor() as cur:
-            # Check if record already exists
-            cur.execute(
-                "SELECT id FROM esg_scores WHERE ticker = %s", (ticker,))
-
             # Extract and normalize ESG data
             esg_risk_score = sustainability.get('ESG Risk Score')
             esg_risk_severity = sustainability.get('ESG Risk Severity')
@@ -546,41 +351,19 @@ def insert_esg_data(conn, ticker, data):
                 except (ValueError, TypeError):
                     governance_score = None
 
-            if cur.fetchone():
-                logger.info(
-                    f"ESG data for {ticker} already exists, updating...")
-                cur.execute("""
-                    UPDATE esg_scores 
-                    SET esg_risk_score = %s, esg_risk_severity = %s, 
-                        environment_score = %s, social_score = %s, governance_score = %s,
-                        historical_scores = %s, last_updated = %s
-                    WHERE ticker = %s
-                """, (
-                    esg_risk_score,
-                    esg_risk_severity,
-                    environment_score,
-                    social_score,
-                    governance_score,
-                    historical_scores,
-                    datetime.now(),
-                    ticker
-                ))
-            else:
-                logger.info(f"Inserting ESG data for {ticker}")
-                cur.execute("""
-                    INSERT INTO esg_scores 
-                    (ticker, esg_risk_score, esg_risk_severity, environment_score, social_score, governance_score, historical_scores, last_updated)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    ticker,
-                    esg_risk_score,
-                    esg_risk_severity,
-                    environment_score,
-                    social_score,
-                    governance_score,
-                    historical_scores,
-                    datetime.now()
-                ))
+            logger.info(f"Upserting ESG data for {ticker}")
+            columns = ['ticker', 'esg_risk_score', 'esg_risk_severity', 'environment_score',
+                       'social_score', 'governance_score', 'historical_scores', 'last_updated']
+            upsert_rows(cur, 'esg_scores', columns, [(
+                ticker,
+                esg_risk_score,
+                esg_risk_severity,
+                environment_score,
+                social_score,
+                governance_score,
+                historical_scores,
+                datetime.now()
+            )], ['ticker'], columns[1:])
         return True
     except Exception as e:
         logger.error(f"Error inserting ESG data for {ticker}: {str(e)}")
@@ -672,10 +455,6 @@ def insert_governance_risk_data(conn, ticker, data):
 
     try:
         with conn.cursor() as cur:
-            # Check if record already exists
-            cur.execute(
-                "SELECT id FROM governance_risk WHERE ticker = %s", (ticker,))
-
             # Ensure all values are properly converted
             if audit_risk is not None and not isinstance(audit_risk, int):
                 try:
@@ -708,73 +487,36 @@ def insert_governance_risk_data(conn, ticker, data):
                 except (ValueError, TypeError):
                     overall_risk = None
 
-            if cur.fetchone():
-                logger.info(
-                    f"Governance risk data for {ticker} already exists, updating...")
-                cur.execute("""
-                    UPDATE governance_risk 
-                    SET audit_risk = %s, board_risk = %s, compensation_risk = %s, 
-                        shareholder_rights_risk = %s, overall_risk = %s, 
-                        total_debt = %s, operating_cashflow = %s, free_cashflow = %s,
-                        return_on_assets = %s, return_on_equity = %s, revenue_growth = %s,
-                        earnings_growth = %s, other_data = %s, custom_price_alert_confidence = %s,
-                        analyst_target_high = %s, analyst_target_low = %s, analyst_target_mean = %s,
-                        recommendation_key = %s, governance_last_updated = %s
-                    WHERE ticker = %s
-                """, (
-                    audit_risk,
-                    board_risk,
-                    compensation_risk,
-                    shareholder_rights_risk,
-                    overall_risk,
-                    total_debt,
-                    operating_cashflow,
-                    free_cashflow,
-                    return_on_assets,
-                    return_on_equity,
-                    revenue_growth,
-                    earnings_growth,
-                    other_data_json,
-                    custom_price_alert_confidence,
-                    target_high,
-                    target_low,
-                    target_mean,
-                    recommendation,
-                    datetime.now(),
-                    ticker
-                ))
-            else:
-                logger.info(f"Inserting governance risk data for {ticker}")
-                cur.execute("""
-                    INSERT INTO governance_risk 
-                    (ticker, audit_risk, board_risk, compensation_risk, shareholder_rights_risk, 
-                    overall_risk, total_debt, operating_cashflow, free_cashflow, return_on_assets, 
-                    return_on_equity, revenue_growth, earnings_growth, other_data, 
-                    custom_price_alert_confidence, analyst_target_high, analyst_target_low, 
-                    analyst_target_mean, recommendation_key, governance_last_updated)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    ticker,
-                    audit_risk,
-                    board_risk,
-                    compensation_risk,
-                    shareholder_rights_risk,
-                    overall_risk,
-                    total_debt,
-                    operating_cashflow,
-                    free_cashflow,
-                    return_on_assets,
-                    return_on_equity,
-                    revenue_growth,
-                    earnings_growth,
-                    other_data_json,
-                    custom_price_alert_confidence,
-                    target_high,
-                    target_low,
-                    target_mean,
-                    recommendation,
-                    datetime.now()
-                ))
+            logger.info(f"Upserting governance risk data for {ticker}")
+            columns = ['ticker', 'audit_risk', 'board_risk', 'compensation_risk',
+                       'shareholder_rights_risk', 'overall_risk', 'total_debt',
+                       'operating_cashflow', 'free_cashflow', 'return_on_assets',
+                       'return_on_equity', 'revenue_growth', 'earnings_growth', 'other_data',
+                       'custom_price_alert_confidence', 'analyst_target_high',
+                       'analyst_target_low', 'analyst_target_mean', 'recommendation_key',
+                       'governance_last_updated']
+            upsert_rows(cur, 'governance_risk', columns, [(
+                ticker,
+                audit_risk,
+                board_risk,
+                compensation_risk,
+                shareholder_rights_risk,
+                overall_risk,
+                total_debt,
+                operating_cashflow,
+                free_cashflow,
+                return_on_assets,
+                return_on_equity,
+                revenue_growth,
+                earnings_growth,
+                other_data_json,
+                custom_price_alert_confidence,
+                target_high,
+                target_low,
+                target_mean,
+                recommendation,
+                datetime.now()
+            )], ['ticker'], columns[1:])
             return True
     except Exception as e:
         logger.error(
@@ -787,45 +529,38 @@ def insert_governance_risk_data(conn, ticker, data):
     return False
 
 
-def process_ticker(ticker):
+def process_ticker(ticker, limiter=None):
     """Process a single ticker: fetch data and upload to database"""
     logger.info(f"Processing ticker: {ticker}")
 
-    # Run test-data.py to get data for this ticker
-    data = run_test_data_script(ticker)
+    # Collect data for this ticker
+    data = fetch_ticker_data(ticker, limiter)
     if not data:
         logger.error(f"Failed to get data for {ticker}")
         return False
 
-    # Connect to database
-    conn = connect_to_db()
-    if not conn:
-        logger.error(f"Failed to connect to database for {ticker}")
-        return False
-
     try:
-        # Insert data into various tables
-        company_success = insert_company_data(conn, ticker, data)
-        financial_success = insert_financial_data(conn, ticker, data)
-        market_success = insert_market_data(conn, ticker, data)
-        esg_success = insert_esg_data(conn, ticker, data)
-        governance_success = insert_governance_risk_data(conn, ticker, data)
-
-        # Commit transaction if at least one insertion was successful
-        if any([company_success, financial_success, market_success, esg_success, governance_success]):
-            conn.commit()
-            logger.info(f"Successfully processed {ticker}")
-            return True
-        else:
-            logger.warning(f"No data was inserted for {ticker}")
-            conn.rollback()
-            return False
+        # Borrow a pooled connection; it is returned when the block exits
+        with get_connection() as conn:
+            # Insert data into various tables
+            company_success = insert_company_data(conn, ticker, data)
+            financial_success = insert_financial_data(conn, ticker, data)
+            market_success = insert_market_data(conn, ticker, data)
+            esg_success = insert_esg_data(conn, ticker, data)
+            governance_success = insert_governance_risk_data(conn, ticker, data)
+
+            # Commit transaction if at least one insertion was successful
+            if any([company_success, financial_success, market_success, esg_success, governance_success]):
+                conn.commit()
+                logger.info(f"Successfully processed {ticker}")
+                return True
+            else:
+                logger.warning(f"No data was inserted for {ticker}")
+                conn.rollback()
+                return False
     except Exception as e:
         logger.error(f"Error processing {ticker}: {str(e)}")
-        conn.rollback()
         return False
-    finally:
-        conn.close()
 
 
 def main():
@@ -836,7 +571,13 @@ def main():
     parser.add_argument(
         '--ticker', '-t', help='Process a single ticker (for testing)')
     parser.add_argument('--delay', '-d', type=int, default=2,
-                        help='Delay between processing tickers (seconds)')
+                        help='Delay between processing tickers (seconds, sequential mode only)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of tickers to process concurrently')
+    parser.add_argument('--yahoo-rpm', type=float, default=60,
+                        help='Requests per minute to Yahoo Finance across all workers')
+    parser.add_argument('--fmp-rpm', type=float, default=60,
+                        help='Requests per minute to Financial Modeling Prep across all workers')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='Enable verbose logging')
     args = parser.parse_args()
@@ -890,21 +631,64 @@ def main():
 
     logger.info(f"Found {len(tickers)} tickers to process")
 
-    # Process each ticker
-    success_count = 0
-    for i, ticker in enumerate(tickers):
-        logger.info(f"Processing ticker {i+1}/{len(tickers)}: {ticker}")
+    # One pooled connection and browser per worker, so workers never wait
+    # on each other for them
+    init_pool(maxconn=args.workers)
+    get_browser_pool(args.workers)
+
+    start_time = time.time()
+    if args.workers > 1:
+        results = process_tickers_concurrently(
+            tickers, args.workers, HostRateLimiter({
+                'yahoo.com': args.yahoo_rpm,
+                'financialmodelingprep.com': args.fmp_rpm
+            }))
+    else:
+        results = {}
+        for i, ticker in enumerate(tickers):
+            logger.info(f"Processing ticker {i+1}/{len(tickers)}: {ticker}")
+            results[ticker] = process_ticker(ticker)
+
+            # Add a small delay to avoid overwhelming APIs
+            if i < len(tickers) - 1:  # Don't delay after the last ticker
+                logger.debug(
+                    f"Waiting {args.delay} seconds before next ticker...")
+                time.sleep(args.delay)
+
+    report_results(results, time.time() - start_time)
+
+
+def process_tickers_concurrently(tickers, workers, limiter):
+    """
+    Process tickers on a bounded thread pool. The shared limiter paces
+    requests per upstream host instead of sleeping between tickers.
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_ticker, ticker, limiter): ticker
+                   for ticker in tickers}
+        for i, future in enumerate(concurrent.futures.as_completed(futures)):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                logger.error(f"Error processing {ticker}: {str(e)}")
+                results[ticker] = False
+            logger.info(f"Finished {i+1}/{len(tickers)}: {ticker}")
+    return results
 
-        if process_ticker(ticker):
-            success_count += 1
 
-        # Add a small delay to avoid overwhelming APIs
-        if i < len(tickers) - 1:  # Don't delay after the last ticker
-            logger.debug(f"Waiting {args.delay} seconds before next ticker...")
-            time.sleep(args.delay)
+def report_results(results, elapsed):
+    """Log throughput and the tickers that failed"""
+    success_count = sum(1 for ok in results.values() if ok)
+    failed = sorted(ticker for ticker, ok in results.items() if not ok)
+    rate = len(results) / elapsed * 60 if elapsed else 0.0
 
     logger.info(
-        f"Completed processing {success_count}/{len(tickers)} tickers successfully")
+        f"Completed processing {success_count}/{len(results)} tickers successfully "
+        f"in {elapsed:.1f}s ({rate:.1f} tickers/min)")
+    if failed:
+        logger.warning(f"Failed tickers ({len(failed)}): {', '.join(failed)}")
 
 
 if __name__ == "__main__":
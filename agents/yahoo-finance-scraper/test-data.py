@@ -3,19 +3,30 @@ import json
 from datetime import date, datetime
 import pandas as pd
 import numpy as np
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import time
 import requests
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+# Add the root directory to Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from utils.browser_pool import get_browser_pool
+
 # Load environment variables
 load_dotenv()
 
+YAHOO_HOST = 'finance.yahoo.com'
+FMP_HOST = 'financialmodelingprep.com'
+
+
+def throttle(limiter, host):
+    """Wait for a request slot for host when a HostRateLimiter is given"""
+    if limiter is not None:
+        limiter.acquire(host)
+
 
 def get_historical_esg_data(ticker):
     """Fetch historical ESG data from Financial Modeling Prep API"""
@@ -76,18 +87,12 @@ def get_historical_esg_data(ticker):
         return None
 
 
-def scrape_sustainability_data(ticker):
-    # Setup Chrome options
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')  # Run in headless mode
-    options.add_argument('--no-sandbox')
-    options.add_argument('--disable-dev-shm-usage')
-
-    # Initialize the driver
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 10)  # Wait up to 10 seconds
+def scrape_sustainability_data(ticker, pool=None):
+    """Scrape Yahoo's sustainability page with a browser from the shared pool"""
+    from selenium.webdriver.common.by import By
+    from selenium.common.exceptions import NoSuchElementException
 
-    try:
+    with (pool or get_browser_pool()).browser() as driver:
         # Navigate to the sustainability page
         url = f'https://finance.yahoo.com/quote/{ticker}/sustainability?p={ticker}'
         driver.get(url)
@@ -156,9 +161,6 @@ def scrape_sustainability_data(ticker):
 
         return sustainability_data
 
-    finally:
-        driver.quit()
-
 # convert all keys to strings
 
 
@@ -186,6 +188,37 @@ class CustomJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 
+def to_json_safe(obj):
+    """
+    Recursively convert yfinance/pandas/numpy values to plain JSON types:
+    string keys, ISO dates, Python numbers, and NaN dropped from dicts (as
+    convert_keys_to_str does) or None elsewhere.
+    """
+    if isinstance(obj, pd.DataFrame):
+        obj = obj.to_dict()
+    elif isinstance(obj, (pd.Series, np.ndarray)):
+        obj = obj.tolist()
+    elif isinstance(obj, tuple):
+        obj = list(obj)
+
+    if isinstance(obj, dict):
+        return {str(key): to_json_safe(value) for key, value in obj.items()
+                if not (isinstance(value, (float, np.floating)) and np.isnan(value))}
+    if isinstance(obj, list):
+        return [to_json_safe(element) for element in obj]
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, (date, datetime, pd.Timestamp)):
+        return obj.isoformat()
+    if isinstance(obj, (bool, np.bool_)):
+        return bool(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, (float, np.floating)):
+        return None if np.isnan(obj) else float(obj)
+    return obj
+
+
 # safe get data from yfinance
 def safe_get_data(func, default=None):
     try:
@@ -195,61 +228,78 @@ def safe_get_data(func, default=None):
         return default
 
 
+def collect_ticker_data(ticker_symbol, limiter=None):
+    """
+    Collect yfinance, Yahoo sustainability and FMP ESG data for a ticker as
+    a JSON-safe dict. limiter (a utils.rate_limit.HostRateLimiter) paces the
+    Yahoo and FMP requests when several tickers are collected in parallel.
+    """
+    dat = yf.Ticker(ticker_symbol)
+    data = {}
+
+    # Company Info
+    throttle(limiter, YAHOO_HOST)
+    info = safe_get_data(lambda: dat.info, {})
+    if info:
+        data["Company Info"] = info
+
+    # Calendar
+    throttle(limiter, YAHOO_HOST)
+    calendar = safe_get_data(lambda: dat.calendar, {})
+    if calendar:
+        data["Calendar"] = calendar
+
+    # Analyst Price Targets
+    throttle(limiter, YAHOO_HOST)
+    targets = safe_get_data(lambda: dat.analyst_price_targets, [])
+    if targets is not None and len(targets) > 0:
+        data["Analyst Price Targets"] = targets
+
+    # Quarterly Income Statement
+    throttle(limiter, YAHOO_HOST)
+    income_stmt = safe_get_data(lambda: dat.quarterly_income_stmt)
+    if isinstance(income_stmt, pd.DataFrame) and not income_stmt.empty:
+        data["Quarterly Income Statement"] = convert_keys_to_str(
+            income_stmt.to_dict())
+
+    # History
+    throttle(limiter, YAHOO_HOST)
+    history = safe_get_data(lambda: dat.history(period='1mo'))
+    if isinstance(history, pd.DataFrame) and not history.empty:
+        data["History"] = convert_keys_to_str(history.to_dict())
+
+    # Option Chain
+    throttle(limiter, YAHOO_HOST)
+    try:
+        if dat.options and len(dat.options) > 0:
+            option_chain = dat.option_chain(dat.options[0])
+            if option_chain:
+                data["Option Chain"] = option_chain._asdict()
+    except Exception:
+        pass
+
+    # Current Sustainability Data from Yahoo Finance
+    throttle(limiter, YAHOO_HOST)
+    sustainability_data = scrape_sustainability_data(ticker_symbol)
+    if sustainability_data:
+        data["Sustainability"] = sustainability_data
+
+    # Historical ESG Data from Financial Modeling Prep
+    throttle(limiter, FMP_HOST)
+    historical_esg = get_historical_esg_data(ticker_symbol)
+    if historical_esg:
+        data["Historical ESG Scores"] = historical_esg
+
+    return to_json_safe(data)
+
+
 if __name__ == "__main__":
     # fetch data from yfinance
-    ticker_symbol = "ACX.TO"
-    dat = yf.Ticker(ticker_symbol)
+    ticker_symbol = sys.argv[1] if len(sys.argv) > 1 else "ACX.TO"
+    data = collect_ticker_data(ticker_symbol)
 
     # save all data to a json file
     with open('dat.json', 'w') as f:
-        data = {}
-
-        # Company Info
-        info = safe_get_data(lambda: dat.info, {})
-        if info:
-            data["Company Info"] = info
-
-        # Calendar
-        calendar = safe_get_data(lambda: dat.calendar, {})
-        if calendar:
-            data["Calendar"] = calendar
-
-        # Analyst Price Targets
-        targets = safe_get_data(lambda: dat.analyst_price_targets, [])
-        if targets is not None and len(targets) > 0:
-            data["Analyst Price Targets"] = targets
-
-        # Quarterly Income Statement
-        income_stmt = safe_get_data(lambda: dat.quarterly_income_stmt)
-        if isinstance(income_stmt, pd.DataFrame) and not income_stmt.empty:
-            data["Quarterly Income Statement"] = convert_keys_to_str(
-                income_stmt.to_dict())
-
-        # History
-        history = safe_get_data(lambda: dat.history(period='1mo'))
-        if isinstance(history, pd.DataFrame) and not history.empty:
-            data["History"] = convert_keys_to_str(history.to_dict())
-
-        # Option Chain
-        try:
-            if dat.options and len(dat.options) > 0:
-                option_chain = dat.option_chain(dat.options[0])
-                if option_chain:
-                    data["Option Chain"] = option_chain._asdict()
-        except Exception:
-            pass
-
-        # Current Sustainability Data from Yahoo Finance
-        sustainability_data = scrape_sustainability_data(ticker_symbol)
-        if sustainability_data:
-            data["Sustainability"] = sustainability_data
-
-        # Historical ESG Data from Financial Modeling Prep
-        historical_esg = get_historical_esg_data(ticker_symbol)
-        if historical_esg:
-            data["Historical ESG Scores"] = historical_esg
-
-        # Write the data to file
         json.dump(data, f, cls=CustomJSONEncoder, indent=4)
 
     print("Data has been saved to dat.json")
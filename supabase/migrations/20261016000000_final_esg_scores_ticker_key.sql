@@ -0,0 +1,7 @@
+-- The scoring agent upserts final scores on ticker, which needs a unique
+-- index. Drop duplicate rows left by the old update-then-insert writes
+-- (keeping one per ticker) so the index can be built.
+delete from final_esg_scores a using final_esg_scores b
+where a.ticker = b.ticker and a.ctid < b.ctid;
+
+create unique index if not exists final_esg_scores_ticker_key on final_esg_scores (ticker);
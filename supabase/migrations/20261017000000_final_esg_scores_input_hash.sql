@@ -0,0 +1,3 @@
+-- Fingerprint of the preprocessed input each final score was computed from,
+-- used by the scoring agent to skip companies whose data has not changed
+alter table final_esg_scores add column if not exists input_hash text;
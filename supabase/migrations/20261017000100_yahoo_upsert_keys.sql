@@ -0,0 +1,20 @@
+-- push-data.py writes with INSERT ... ON CONFLICT, which needs a unique
+-- index on each conflict target. Drop older duplicates (keeping the newest
+-- row) so the indexes can be built.
+delete from financials a using financials b
+where a.ticker = b.ticker and a.report_date = b.report_date and a.id < b.id;
+
+delete from market_data a using market_data b
+where a.ticker = b.ticker and a.date = b.date and a.id < b.id;
+
+delete from esg_scores a using esg_scores b
+where a.ticker = b.ticker and a.id < b.id;
+
+delete from governance_risk a using governance_risk b
+where a.ticker = b.ticker and a.id < b.id;
+
+create unique index if not exists companies_ticker_key on companies (ticker);
+create unique index if not exists financials_ticker_report_date_key on financials (ticker, report_date);
+create unique index if not exists market_data_ticker_date_key on market_data (ticker, date);
+create unique index if not exists esg_scores_ticker_key on esg_scores (ticker);
+create unique index if not exists governance_risk_ticker_key on governance_risk (ticker);
@@ -0,0 +1,179 @@
+"""
+Pool of long-lived headless Chrome drivers shared by the Selenium scrapers.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+HEADLESS_ARGS = ('--headless', '--no-sandbox', '--disable-dev-shm-usage')
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+_driver_path = None
+_driver_path_resolved = False
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path():
+    """
+    Resolve the chromedriver binary once per process: CHROMEDRIVER_PATH if
+    set, else webdriver_manager's download. None leaves it to Selenium.
+    Concurrent first callers wait for a single resolution.
+    """
+    global _driver_path, _driver_path_resolved
+    with _driver_path_lock:
+        if not _driver_path_resolved:
+            _driver_path = _resolve_chromedriver_path()
+            _driver_path_resolved = True
+        return _driver_path
+
+
+def _resolve_chromedriver_path():
+    path = os.getenv('CHROMEDRIVER_PATH')
+    if path:
+        return path
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+    except ImportError:
+        return None
+    return ChromeDriverManager().install()
+
+
+def create_driver(page_load_timeout=30):
+    """Start a headless Chrome driver"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    for arg in HEADLESS_ARGS:
+        options.add_argument(arg)
+    path = chromedriver_path()
+    service = Service(path) if path else Service()
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+class BrowserPool:
+    """
+    Up to size drivers, started on demand and reused across tasks. A task
+    gets a fresh tab (the previous task's tabs are closed on checkin), and
+    drivers that crashed, stopped responding or served max_uses tasks are
+    quit and replaced.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, factory=create_driver, max_uses=200):
+        self.size = size
+        self.factory = factory
+        self.max_uses = max_uses
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._closed = False
+
+    def checkout(self, timeout=None):
+        """Take a driver, waiting up to timeout seconds for a free one"""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("No browser available in the pool")
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._start()
+                if self._is_alive(driver):
+                    return driver
+                logger.warning("Replacing crashed browser")
+                self._quit(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def checkin(self, driver):
+        """Return a driver, recycling its tab or replacing it if it broke"""
+        try:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            if self._closed or self._uses[id(driver)] >= self.max_uses or \
+                    not self._recycle_tab(driver):
+                self._quit(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def browser(self, timeout=None):
+        """Check a driver out for the duration of a with block"""
+        driver = self.checkout(timeout)
+        try:
+            yield driver
+        finally:
+            self.checkin(driver)
+
+    def close(self):
+        """Quit every idle driver; drivers still checked out quit on checkin"""
+        self._closed = True
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _start(self):
+        driver = self.factory()
+        self._uses[id(driver)] = 0
+        logger.info("Started browser for the pool")
+        return driver
+
+    @staticmethod
+    def _is_alive(driver):
+        try:
+            driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _recycle_tab(driver):
+        """Open a blank tab and close the rest, so no page state leaks between tasks"""
+        try:
+            old_handles = driver.window_handles
+            driver.switch_to.new_window('tab')
+            fresh = driver.current_window_handle
+            for handle in old_handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(fresh)
+            return True
+        except Exception as e:
+            logger.warning(f"Discarding browser that failed to recycle: {str(e)}")
+            return False
+
+    def _quit(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+def get_browser_pool(size=None):
+    """
+    Process-wide BrowserPool, created on first use with size drivers
+    (default BROWSER_POOL_SIZE); later calls return the same pool.
+    """
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool(size or BROWSER_POOL_SIZE)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
@@ -0,0 +1,54 @@
+"""
+Lazily created API clients shared by the agents.
+
+SDKs are imported and clients created on first use, so importing an agent
+module has no network, credential or configuration side effects.
+"""
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Load variables from .env once"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+def require_env(*names):
+    """Return the values of environment variables, raising if any is missing"""
+    load_env()
+    values = [os.getenv(name) for name in names]
+    missing = [name for name, value in zip(names, values) if not value]
+    if missing:
+        raise ValueError(
+            f"Missing required environment variables: {', '.join(missing)}")
+    return values
+
+
+@functools.lru_cache(maxsize=None)
+def get_supabase():
+    """Shared Supabase client for SUPABASE_STRING / SUPABASE_API_KEY"""
+    from supabase import create_client
+    url, key = require_env('SUPABASE_STRING', 'SUPABASE_API_KEY')
+    client = create_client(url, key)
+    logger.info(f"Initialized Supabase client with URL: {url[:30]}...")
+    return client
+
+
+@functools.lru_cache(maxsize=None)
+def get_genai():
+    """The google.generativeai module, configured with GEMINI_API_KEY"""
+    import google.generativeai as genai
+    api_key, = require_env('GEMINI_API_KEY')
+    genai.configure(api_key=api_key)
+    return genai
+
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_model(model_name='gemini-2.0-flash'):
+    """Shared GenerativeModel instance for a model name"""
+    return get_genai().GenerativeModel(model_name)
@@ -1,6 +1,11 @@
 import os
+import time
+import atexit
 import logging
+import threading
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import pool, extras
 from dotenv import load_dotenv
 
 # Set up logging
@@ -19,10 +24,19 @@ load_dotenv()
 
 # Database configuration
 DB_URL = os.getenv('SUPABASE_URL')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+# Connections idle for longer than this are pinged before being handed out
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_last_used = {}
 
 
 def get_db_connection():
-    """Get a PostgreSQL connection"""
+    """Get a new, unpooled PostgreSQL connection (prefer get_connection)"""
     try:
         conn = psycopg2.connect(DB_URL)
         conn.autocommit = False  # Use transactions
@@ -32,24 +46,139 @@ def get_db_connection():
         raise
 
 
+def init_pool(minconn=None, maxconn=None):
+    """
+    Create the shared connection pool. Sizes default to DB_POOL_MIN and
+    DB_POOL_MAX; calling it again once the pool exists has no effect.
+    """
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            minconn = DB_POOL_MIN if minconn is None else minconn
+            maxconn = max(DB_POOL_MAX if maxconn is None else maxconn, minconn)
+            _pool = pool.ThreadedConnectionPool(minconn, maxconn, DB_URL)
+            # ThreadedConnectionPool raises when exhausted, so callers
+            # wait for a free slot instead
+            _pool_slots = threading.BoundedSemaphore(maxconn)
+            logger.info(f"Created database pool ({minconn}-{maxconn} connections)")
+        return _pool
+
+
+def close_pool():
+    """Close every pooled connection"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+
+atexit.register(close_pool)
+
+
+def _is_healthy(conn):
+    """Check a pooled connection before reuse, pinging it if it sat idle"""
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_SECONDS:
+        # Freshly opened or recently used
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(db_pool):
+    conn = db_pool.getconn()
+    if not _is_healthy(conn):
+        logger.warning("Replacing broken pooled database connection")
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+        conn = db_pool.getconn()
+    conn.autocommit = False  # Use transactions
+    return conn
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a connection from the shared pool. The transaction is committed
+    when the block exits cleanly and rolled back if it raises; the
+    connection then goes back to the pool (or is discarded if it broke).
+    """
+    db_pool = init_pool()
+    _pool_slots.acquire()
+    conn = None
+    try:
+        conn = _checkout(db_pool)
+        yield conn
+        conn.commit()
+    except Exception:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn is not None:
+            if conn.closed:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            db_pool.putconn(conn, close=bool(conn.closed))
+        _pool_slots.release()
+
+
 def execute_query(query, params=None):
     """Execute a SQL query and return results"""
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(query, params)
-            if query.strip().upper().startswith('SELECT'):
-                return cur.fetchall()
-            conn.commit()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                if query.strip().upper().startswith('SELECT'):
+                    return cur.fetchall()
     except Exception as e:
-        if conn:
-            conn.rollback()
         logger.error(f"Query execution error: {str(e)}")
         raise
-    finally:
-        if conn:
-            conn.close()
+
+
+def execute_many(query, params_list, page_size=100):
+    """Run a parameterized statement for every params tuple in one transaction"""
+    params_list = list(params_list)
+    if not params_list:
+        return 0
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                extras.execute_batch(cur, query, params_list, page_size=page_size)
+        return len(params_list)
+    except Exception as e:
+        logger.error(f"Batch execution error: {str(e)}")
+        raise
+
+
+def execute_values(query, rows, template=None, page_size=1000, fetch=False):
+    """
+    Insert many rows with a multi-row VALUES statement; query must contain a
+    single %s placeholder for the VALUES list. Returns the fetched rows
+    (e.g. from RETURNING) when fetch is set, otherwise the number of rows.
+    """
+    rows = list(rows)
+    if not rows:
+        return [] if fetch else 0
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                result = extras.execute_values(cur, query, rows, template=template,
+                                               page_size=page_size, fetch=fetch)
+        return result if fetch else len(rows)
+    except Exception as e:
+        logger.error(f"Batch insert error: {str(e)}")
+        raise
 
 
 def get_companies():
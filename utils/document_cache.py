@@ -0,0 +1,164 @@
+"""
+Persistent store for downloaded documents and their extracted text.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentCache:
+    """
+    Keeps raw document bytes and extracted text on disk, keyed by a hash of
+    the URL, together with the ETag / Last-Modified validators needed for
+    conditional GETs. Least recently used documents are evicted once the
+    total size exceeds max_bytes.
+    """
+
+    def __init__(self, directory='.cache/documents', max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'),
+                                     check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                url TEXT PRIMARY KEY,
+                key TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER,
+                has_text INTEGER DEFAULT 0,
+                accessed_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def lookup(self, url):
+        """Return the index entry for a URL or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, etag, last_modified, has_text FROM documents WHERE url = ?",
+                (url,)).fetchone()
+        if not row or not os.path.exists(self._path(row[0], '.pdf')):
+            return None
+        return {'key': row[0], 'etag': row[1], 'last_modified': row[2], 'has_text': bool(row[3])}
+
+    def conditional_headers(self, url):
+        """Headers for revalidating a cached URL with a conditional GET"""
+        entry = self.lookup(url)
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, url):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def load_bytes(self, url):
+        entry = self.lookup(url)
+        if not entry:
+            return None
+        self.touch(url)
+        with open(self._path(entry['key'], '.pdf'), 'rb') as f:
+            return f.read()
+
+    def load_text(self, url):
+        entry = self.lookup(url)
+        if not entry or not entry['has_text']:
+            return None
+        self.touch(url)
+        with open(self._path(entry['key'], '.txt'), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def store(self, url, source, etag=None, last_modified=None):
+        """Store a document given as bytes or as the path of a file"""
+        key = self.make_key(url)
+        path = self._path(key, '.pdf')
+        if isinstance(source, (bytes, bytearray)):
+            with open(path, 'wb') as f:
+                f.write(source)
+        else:
+            shutil.copyfile(source, path)
+        for suffix in ('.txt', '.pages.json'):
+            if os.path.exists(self._path(key, suffix)):
+                os.remove(self._path(key, suffix))
+
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO documents (url, key, etag, last_modified, size, has_text, accessed_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?)
+            """, (url, key, etag, last_modified, os.path.getsize(path), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def load_pages(self, url):
+        """Return the page offsets stored with the extracted text, if any"""
+        entry = self.lookup(url)
+        if not entry or not os.path.exists(self._path(entry['key'], '.pages.json')):
+            return None
+        with open(self._path(entry['key'], '.pages.json'), 'r') as f:
+            return json.load(f)
+
+    def store_text(self, url, text, pages=None):
+        """Store the extracted text (and optional page offsets) of a cached document"""
+        entry = self.lookup(url)
+        if not entry:
+            return
+        text_path = self._path(entry['key'], '.txt')
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        size = os.path.getsize(self._path(entry['key'], '.pdf')) + os.path.getsize(text_path)
+        if pages is not None:
+            pages_path = self._path(entry['key'], '.pages.json')
+            with open(pages_path, 'w') as f:
+                json.dump(pages, f)
+            size += os.path.getsize(pages_path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET has_text = 1, size = ? WHERE url = ?",
+                (size, url))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT url, key, size FROM documents ORDER BY accessed_at").fetchall()
+        for url, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            for suffix in ('.pdf', '.txt', '.pages.json'):
+                try:
+                    os.remove(self._path(key, suffix))
+                except FileNotFoundError:
+                    pass
+            self._conn.execute("DELETE FROM documents WHERE url = ?", (url,))
+            total -= size
+            logger.info(f"Evicted cached document {url}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
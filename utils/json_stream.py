@@ -0,0 +1,117 @@
+"""
+Incremental JSON extraction from streamed LLM responses.
+"""
+import json
+
+OPENERS = {'{': '}', '[': ']'}
+
+
+class StreamingJSONExtractor:
+    """
+    Scans text as it arrives and parses every balanced JSON object or array.
+    Strings are only tracked inside a bracketed candidate, so quotes and
+    apostrophes in surrounding prose are ignored.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._stack = []  # (start index, expected closer)
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        """Add a chunk of text and return (value, is_top_level) pairs completed by it"""
+        self.text += chunk
+        completed = []
+        text = self.text
+
+        while self._pos < len(text):
+            char = text[self._pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._stack:
+                self._in_string = True
+            elif char in OPENERS:
+                self._stack.append((self._pos, OPENERS[char]))
+            elif self._stack and char in ('}', ']'):
+                start, closer = self._stack.pop()
+                if char != closer:
+                    # Mismatched bracket, so this was prose rather than JSON
+                    self._stack = []
+                else:
+                    try:
+                        value = json.loads(text[start:self._pos + 1])
+                        completed.append((value, not self._stack))
+                    except json.JSONDecodeError:
+                        pass
+            self._pos += 1
+
+        return completed
+
+
+def extract_json_from_stream(chunks, predicate=None, top_level_only=None):
+    """
+    Consume text chunks until a JSON value is complete and return it with
+    the text read so far. Values must satisfy predicate (if given) and, when
+    top_level_only is set, must not be nested in another value; by default
+    nested values are only considered when a predicate is given. Stops
+    reading as soon as a value matches, so the rest of the stream is never
+    consumed. Returns (None, text) when the stream ends without a match.
+    """
+    extractor = StreamingJSONExtractor()
+    for chunk in chunks:
+        found, value = _match(extractor, chunk, predicate, top_level_only)
+        if found:
+            return value, extractor.text
+    return None, extractor.text
+
+
+async def extract_json_from_async_stream(chunks, predicate=None, top_level_only=None):
+    """Async counterpart of extract_json_from_stream for async iterables"""
+    extractor = StreamingJSONExtractor()
+    async for chunk in chunks:
+        found, value = _match(extractor, chunk, predicate, top_level_only)
+        if found:
+            return value, extractor.text
+    return None, extractor.text
+
+
+def _match(extractor, chunk, predicate, top_level_only):
+    if top_level_only is None:
+        top_level_only = predicate is None
+    for value, is_top_level in extractor.feed(chunk):
+        if top_level_only and not is_top_level:
+            continue
+        if predicate is None or predicate(value):
+            return True, value
+    return False, None
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:
+        # Chunks without text parts (e.g. a bare finish reason)
+        return None
+
+
+def iter_response_text(response):
+    """Yield the text of each chunk of a streamed Gemini response"""
+    for chunk in response:
+        text = _chunk_text(chunk)
+        if text:
+            yield text
+
+
+async def aiter_response_text(response):
+    """Yield the text of each chunk of an async streamed Gemini response"""
+    async for chunk in response:
+        text = _chunk_text(chunk)
+        if text:
+            yield text
@@ -0,0 +1,164 @@
+"""
+Rate limiting utilities shared by the DataMinds agents.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=1):
+        """Create a bucket allowing `requests_per_minute` sustained requests"""
+        return cls(requests_per_minute / 60.0, capacity=burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self, tokens):
+        """Take tokens if available, otherwise return the seconds until they are"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available without blocking"""
+        return self._take(tokens) == 0.0
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available and return the seconds waited"""
+        waited = 0.0
+        while True:
+            sleep_time = self._take(tokens)
+            if not sleep_time:
+                return waited
+            time.sleep(sleep_time)
+            waited += sleep_time
+
+    async def acquire_async(self, tokens=1):
+        """Like acquire, but sleeps without blocking the event loop"""
+        waited = 0.0
+        while True:
+            sleep_time = self._take(tokens)
+            if not sleep_time:
+                return waited
+            await asyncio.sleep(sleep_time)
+            waited += sleep_time
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket whose rate adapts to the server: it is cut multiplicatively
+    when a call is throttled (e.g. HTTP 429) and raised additively back
+    towards the configured rate after successful calls.
+    """
+
+    def __init__(self, rate, capacity=1, min_rate=None, increase=None, decrease=0.5):
+        super().__init__(rate, capacity)
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.increase = increase if increase is not None else rate / 20
+        self.decrease = decrease
+        self._paused_until = 0.0
+
+    def _pause_remaining(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def acquire(self, tokens=1):
+        """Wait out any server-requested pause, then take tokens"""
+        pause = self._pause_remaining()
+        if pause:
+            time.sleep(pause)
+        return pause + super().acquire(tokens)
+
+    async def acquire_async(self, tokens=1):
+        pause = self._pause_remaining()
+        if pause:
+            await asyncio.sleep(pause)
+        return pause + await super().acquire_async(tokens)
+
+    def record_success(self):
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_throttle(self, retry_after=None):
+        """Slow down after a throttled call, pausing for retry_after seconds if given"""
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until,
+                                         time.monotonic() + retry_after)
+
+
+class HostRateLimiter:
+    """
+    Independent token buckets per upstream host, so one slow or strict API
+    does not throttle calls to another. Subdomains share their parent's
+    bucket; hosts without a configured rate are not limited.
+    """
+
+    def __init__(self, requests_per_minute, burst=1):
+        self.buckets = {host: TokenBucket.per_minute(rpm, burst)
+                        for host, rpm in requests_per_minute.items()}
+
+    def bucket_for(self, host_or_url):
+        host = urlparse(host_or_url).hostname if '://' in host_or_url else host_or_url
+        while host:
+            if host in self.buckets:
+                return self.buckets[host]
+            host = host.partition('.')[2]
+        return None
+
+    def acquire(self, host_or_url, tokens=1):
+        """Block until the host's bucket has tokens and return the seconds waited"""
+        bucket = self.bucket_for(host_or_url)
+        return bucket.acquire(tokens) if bucket else 0.0
+
+
+def is_throttle_error(error):
+    """Whether an exception from an API client signals rate limiting (HTTP 429)"""
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429:
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    return type(error).__name__ == 'ResourceExhausted' or '429' in str(error)
+
+
+TRANSIENT_ERROR_NAMES = {'TransportError', 'TimeoutException', 'NetworkError',
+                         'ServiceUnavailable', 'DeadlineExceeded'}
+
+
+def is_transient_error(error):
+    """
+    Whether an exception looks worth retrying later: throttling, network
+    and timeout errors, or an HTTP 5xx response
+    """
+    if is_throttle_error(error) or isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    for status in (getattr(error, 'status_code', None),
+                   getattr(getattr(error, 'response', None), 'status_code', None)):
+        if isinstance(status, int) and status >= 500:
+            return True
+    return False
@@ -0,0 +1,175 @@
+"""
+Lightweight text utilities for trimming and ranking LLM inputs.
+"""
+import math
+import re
+from collections import Counter
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has',
+    'have', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'their',
+    'this', 'to', 'was', 'were', 'will', 'with'
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text, drop_stopwords=True):
+    """Lowercase word tokens, optionally without stopwords"""
+    tokens = WORD_PATTERN.findall((text or '').lower())
+    if drop_stopwords:
+        return [tok for tok in tokens if tok not in STOPWORDS]
+    return tokens
+
+
+def estimate_tokens(text):
+    """Rough LLM token estimate (about 4 characters per token)"""
+    return math.ceil(len(text or '') / 4)
+
+
+def truncate(text, max_chars):
+    """Cut text at a word boundary so it fits in max_chars"""
+    if not text or len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(' ')
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '...'
+
+
+def shingles(text, size=5):
+    """Set of word n-grams used for near-duplicate detection"""
+    tokens = tokenize(text, drop_stopwords=False)
+    if len(tokens) <= size:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def jaccard(a, b):
+    """Jaccard similarity of two sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def keyword_score(text, keywords):
+    """Sublinear term-frequency overlap between text and a keyword set"""
+    counts = Counter(tok for tok in tokenize(text) if tok in keywords)
+    return sum(1 + math.log(tf) for tf in counts.values())
+
+
+# Blank lines, or form feeds between PDF pages
+PARAGRAPH_BREAK = re.compile(r"\f|\n\s*\n")
+
+
+def split_passages(text, min_chars=200, max_chars=2000):
+    """Split text into paragraphs, breaking up long ones and merging short ones"""
+    pieces = []
+    for para in PARAGRAPH_BREAK.split(text or ''):
+        para = para.strip()
+        while len(para) > max_chars:
+            cut = para.rfind(' ', 0, max_chars)
+            if cut <= max_chars // 2:
+                cut = max_chars
+            pieces.append(para[:cut].rstrip())
+            para = para[cut:].lstrip()
+        if para:
+            pieces.append(para)
+
+    passages = []
+    for piece in pieces:
+        if passages and len(passages[-1]) < min_chars and \
+                len(passages[-1]) + len(piece) < max_chars:
+            passages[-1] += '\n' + piece
+        else:
+            passages.append(piece)
+    return passages
+
+
+class BM25:
+    """Okapi BM25 ranking over a fixed list of passages"""
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(passage)) for passage in passages]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        doc_freqs = Counter(term for tf in self.term_freqs for term in tf)
+        count = len(passages)
+        self.idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+                    for term, df in doc_freqs.items()}
+
+    def scores(self, query_terms):
+        """Score every passage against a set of query terms"""
+        terms = [term for term in set(query_terms) if term in self.idf]
+        results = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) \
+                if self.avg_length else self.k1
+            results.append(sum(
+                self.idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + norm)
+                for term in terms if term in tf))
+        return results
+
+
+def _split_to_fit(block, max_tokens, count):
+    """Break a block over max_tokens at line boundaries, then at words"""
+    if count(block) <= max_tokens:
+        return [block]
+    lines = block.split('\n')
+    if len(lines) > 1:
+        return [piece for line in lines if line.strip()
+                for piece in _split_to_fit(line, max_tokens, count)]
+    pieces = []
+    max_chars = max_tokens * 4
+    while block:
+        # truncate() marks a cut with '...', which is not part of the text
+        piece = block if len(block) <= max_chars else truncate(block, max_chars)[:-3]
+        pieces.append(piece)
+        block = block[len(piece):].lstrip()
+    return pieces
+
+
+def _overlap_tail(pieces, overlap_tokens, count):
+    """Trailing pieces (or the end of the last one) worth about overlap_tokens"""
+    tail, tokens = [], 0
+    for piece in reversed(pieces):
+        piece_tokens = count(piece)
+        if tokens + piece_tokens > overlap_tokens:
+            break
+        tail.insert(0, piece)
+        tokens += piece_tokens
+    if not tail and overlap_tokens and pieces:
+        end = pieces[-1][-overlap_tokens * 4:]
+        space = end.find(' ')
+        tail = [end[space + 1:] if 0 <= space < len(end) // 2 else end]
+        tokens = count(tail[0])
+    return tail, tokens
+
+
+def chunk_by_tokens(text, max_tokens=25000, overlap_tokens=200, count=estimate_tokens):
+    """
+    Lazily yield chunks of at most about max_tokens tokens. Chunks break at
+    page and paragraph boundaries where possible (then lines, then words)
+    and start with up to overlap_tokens of trailing context from the
+    previous chunk.
+    """
+    current, tokens, fresh = [], 0, False
+    for block in PARAGRAPH_BREAK.split(text or ''):
+        block = block.strip()
+        if not block:
+            continue
+        for piece in _split_to_fit(block, max_tokens, count):
+            piece_tokens = count(piece)
+            if fresh and tokens + piece_tokens > max_tokens:
+                yield '\n\n'.join(current)
+                current, tokens = _overlap_tail(current, overlap_tokens, count)
+                if tokens + piece_tokens > max_tokens:
+                    current, tokens = [], 0
+            current.append(piece)
+            tokens += piece_tokens
+            fresh = True
+    if fresh:
+        yield '\n\n'.join(current)